@@ -0,0 +1,89 @@
+"""
+最终图片绘制基准测试：串行绘制 (core.rasterizer.rasterize) vs 分块并行绘制 (TileRasterizer 的线程/进程模式)
+
+Pillow 的 Font.render 不释放 GIL，线程模式基本无法并行，跨分块的词还会在每个分块里重复绘制；
+进程模式才能用上多核。加速比取决于 CPU 核数，单核机器上 TileRasterizer 会直接退回串行绘制。
+
+用法 (在项目根目录运行)：
+    python benchmarks/bench_rasterizer.py
+    python benchmarks/bench_rasterizer.py --words 4000 --workers 8 --font C:/Windows/Fonts/msyh.ttc
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.generator import WordCloudGenerator  # noqa: E402
+from core.rasterizer import TileRasterizer, rasterize  # noqa: E402
+
+RESOLUTIONS = {
+    "4K": (3840, 2160),
+    "8K": (7680, 4320),
+}
+WORDS = ["经济", "发展", "人工智能", "北京", "改革开放", "科技", "创新", "新闻报道", "数据", "云计算"]
+
+
+def make_items(width, height, count, seed=0):
+    """模拟排版结果：少数大字、大量小字，约一成竖排，坐标为整数像素"""
+    rng = np.random.default_rng(seed)
+    colors = ["#440154", "#3b528b", "#21918c", "#5ec962", "#fde725"]
+    items = []
+    for i in range(count):
+        font_size = max(8, int(height / 6 / (1 + i / 20)))
+        orientation = Image.Transpose.ROTATE_90 if rng.random() < 0.1 else None
+        x, y = int(rng.integers(0, width - font_size)), int(rng.integers(0, height - font_size))
+        items.append((WORDS[i % len(WORDS)], font_size, orientation, (x, y), colors[i % len(colors)]))
+    return items
+
+
+def timed(func, repeat):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--font", help="字体文件 (默认同 WordCloudGenerator)")
+    parser.add_argument("--words", type=int, default=2000, help="词数")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="并行数")
+    parser.add_argument("--repeat", type=int, default=3, help="重复次数 (取最快)")
+    args = parser.parse_args()
+
+    font_path = args.font or WordCloudGenerator().font_path
+    if not font_path:
+        parser.error("未找到默认中文字体，请用 --font 指定")
+
+    threads = TileRasterizer(workers=args.workers, use_processes=False)
+    processes = TileRasterizer(workers=args.workers, use_processes=True)
+    print(f"并行数: {args.workers} | 词数: {args.words}")
+    print(f"{'分辨率':<8}{'串行':>10}{'线程':>10}{'进程':>10}{'进程加速比':>12}  结果一致")
+    try:
+        for name, (width, height) in RESOLUTIONS.items():
+            items = make_items(width, height, args.words)
+            draw_args = ("RGB", (width, height), "white", font_path, items)
+            # 预热：载入字体、启动线程/进程
+            threads.render(*draw_args)
+            processes.render(*draw_args)
+            serial_time, serial_image = timed(lambda: rasterize(*draw_args), args.repeat)
+            thread_time, thread_image = timed(lambda: threads.render(*draw_args), args.repeat)
+            process_time, process_image = timed(lambda: processes.render(*draw_args), args.repeat)
+            same = serial_image.tobytes() == thread_image.tobytes() == process_image.tobytes()
+            print(f"{name:<8}{serial_time:>9.3f}s{thread_time:>9.3f}s{process_time:>9.3f}s"
+                  f"{serial_time / process_time:>11.2f}x  {same}")
+    finally:
+        threads.shutdown()
+        processes.shutdown()
+
+
+if __name__ == "__main__":
+    main()
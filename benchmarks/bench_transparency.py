@@ -0,0 +1,97 @@
+"""
+透明背景后处理基准测试：逐像素 Python 循环 (旧实现) vs 通道运算 (WordCloudGenerator._clear_white_background)
+
+用法 (在项目根目录运行)：
+    python benchmarks/bench_transparency.py
+    python benchmarks/bench_transparency.py --skip-legacy   # 8K 下旧实现需要数十秒和数 GB 内存
+"""
+import argparse
+import os
+import sys
+import time
+import warnings
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.generator import WordCloudGenerator  # noqa: E402
+
+RESOLUTIONS = {
+    "1080P": (1920, 1080),
+    "4K": (3840, 2160),
+    "8K": (7680, 4320),
+}
+
+
+def make_sample(width, height, seed=0):
+    """模拟透明模式的渲染结果：透明底、彩色文字块，混入白色残留与半透明边缘"""
+    rng = np.random.default_rng(seed)
+    image = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(image)
+    for _ in range(2000):
+        x, y = int(rng.integers(0, width)), int(rng.integers(0, height))
+        w, h = int(rng.integers(10, width // 10)), int(rng.integers(5, height // 20))
+        color = tuple(int(c) for c in rng.integers(0, 256, 3)) + (int(rng.integers(64, 256)),)
+        draw.rectangle([x, y, x + w, y + h], fill=color)
+    # 白色残留像素
+    arr = np.asarray(image).copy()
+    ys = rng.integers(0, height, width * height // 50)
+    xs = rng.integers(0, width, width * height // 50)
+    arr[ys, xs, :3] = rng.integers(251, 256, (len(ys), 3))
+    arr[ys, xs, 3] = 255
+    return Image.fromarray(arr, "RGBA")
+
+
+def legacy(image):
+    """旧实现：逐像素遍历"""
+    # getdata 在新版 Pillow 中已弃用，这里只为复现旧实现
+    warnings.simplefilter("ignore", DeprecationWarning)
+    image = image.convert("RGBA")
+    new_data = []
+    for item in image.getdata():
+        if item[0] > 250 and item[1] > 250 and item[2] > 250:
+            new_data.append((255, 255, 255, 0))
+        else:
+            new_data.append(item)
+    image.putdata(new_data)
+    return image
+
+
+def vectorized(image):
+    image = image.copy()
+    WordCloudGenerator._clear_white_background(image)
+    return image
+
+
+def timed(func, image, repeat):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(image)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--skip-legacy", action="store_true", help="不运行旧实现")
+    parser.add_argument("--repeat", type=int, default=3, help="新实现重复次数 (取最快)")
+    args = parser.parse_args()
+
+    print(f"{'分辨率':<8}{'旧实现':>12}{'新实现':>12}{'加速比':>10}  结果一致")
+    for name, (width, height) in RESOLUTIONS.items():
+        sample = make_sample(width, height)
+        new_time, new_image = timed(vectorized, sample, args.repeat)
+        if args.skip_legacy:
+            print(f"{name:<8}{'-':>12}{new_time:>11.3f}s{'-':>10}  -")
+            continue
+        old_time, old_image = timed(legacy, sample, 1)
+        same = old_image.tobytes() == new_image.tobytes()
+        print(f"{name:<8}{old_time:>11.3f}s{new_time:>11.3f}s{old_time / new_time:>9.0f}x  {same}")
+
+
+if __name__ == "__main__":
+    main()
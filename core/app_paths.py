@@ -0,0 +1,19 @@
+import os
+import sys
+
+APP_DIR_NAME = "WordCloudStudio"
+
+
+def cache_dir(*parts):
+    """
+    应用缓存目录 (Windows 位于 %LOCALAPPDATA%，其他系统位于 ~/.cache)
+    不存在时自动创建
+    :param parts: 子目录名，例如 cache_dir("tokens")
+    """
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    path = os.path.join(base, APP_DIR_NAME, *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
@@ -1,13 +1,188 @@
+import codecs
+import io
+import mmap
 import os
-import docx
+import posixpath
+import re
+import zipfile
+from multiprocessing import Pool, cpu_count, current_process
+
 import pdfplumber
+import pypdfium2
+from lxml import etree
+
+# 流式读取时每次从磁盘读取的字节数
+STREAM_BLOCK_BYTES = 4 * 1024 * 1024
+# 编码探测使用的样本大小
+ENCODING_SAMPLE_BYTES = 1024 * 1024
+TXT_ENCODINGS = ['utf-8', 'gbk', 'utf-16']
+# 带 BOM 的文件直接按 BOM 确定编码 (utf-16 解码器会自行去掉 BOM)
+_BOM_ENCODINGS = [(codecs.BOM_UTF8, 'utf-8-sig'), (codecs.BOM_UTF16_LE, 'utf-16'), (codecs.BOM_UTF16_BE, 'utf-16')]
+# 换行符 0x0A 不会出现在多字节字符内部的编码：可以直接在字节上找换行切块 (UTF-16 不行)
+MAPPABLE_ENCODINGS = ('ascii', 'utf-8', 'utf-8-sig', 'gbk')
+# 非 ASCII 字节；NUL 在 UTF-8/GBK 文本中不会出现，一并找出用来识别无 BOM 的 UTF-16
+_NON_ASCII = re.compile(rb'[\x00\x80-\xff]')
+# 从字符边界开始逐字匹配 GBK (双字节字符的后续字节可能与 ASCII 重叠，不能从任意位置往回找边界)
+_GBK_CHARS = re.compile(rb'(?:[\x81-\xfe][\x40-\xfe]|[\x00-\x80\xff])*')
+# 语料模式 (多个文件或文件夹) 收录的文件类型
+CORPUS_EXTENSIONS = ('.txt', '.docx', '.pdf')
+# PDF 页数不少于该值且有多个 CPU 时，按页段分给多个进程并行提取
+PDF_PARALLEL_MIN_PAGES = 16
+# 每个并行任务提取的页数 (也是进度报告的粒度)
+PDF_PAGES_PER_TASK = 4
+
+# .docx 的 WordprocessingML 命名空间
+_W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+_DOCX_MAIN_RELATIONSHIP = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument'
+# 段落内 w:r 的子元素与对应文字 (同 python-docx 的 Run.text；w:br 仅换行类型对应换行，分页/分栏为空)
+_DOCX_RUN_TEXT = {_W + 'tab': '\t', _W + 'ptab': '\t', _W + 'cr': '\n', _W + 'noBreakHyphen': '-'}
+
+# 子进程中已打开的 PDF：(文档对象, 是否仅提取文字)
+_pdf_worker_state = None
+
+
+def _detect_encoding(sample, at_start):
+    """
+    由一段样本判断文本编码：先看 BOM，再看 NUL 字节的位置 (UTF-16)，最后按候选顺序试解码，取坏字节极少的第一个
+    :param at_start: 样本是否从文件开头开始 (只有文件开头才可能有 BOM)
+    """
+    if at_start:
+        for bom, enc in _BOM_ENCODINGS:
+            if sample.startswith(bom):
+                return enc
+    zeros = sample.count(0)
+    if zeros:
+        # 无 BOM 的 UTF-16：ASCII 字符的高位字节为 0，按 0 落在奇数位还是偶数位区分字节序
+        odd = sample[1::2].count(0)
+        return 'utf-16-le' if odd * 2 >= zeros else 'utf-16-be'
+    for enc in TXT_ENCODINGS:
+        # final=False：样本末尾被截断的多字节字符不算错误
+        try:
+            text = codecs.getincrementaldecoder(enc)(errors='replace').decode(sample, final=False)
+        except UnicodeError:
+            # utf-16 解码器在没有 BOM 时直接报错 (errors='replace' 不管这种情况)，视为不是该编码
+            continue
+        bad = text.count('\ufffd')
+        # 容忍个别坏字节 (例如末尾夹杂的一个乱码)；编码选错时几乎每个非 ASCII 字符都会解码失败
+        if bad * 100 <= len(text) - len(text.encode('ascii', 'ignore')) - bad:
+            return enc
+    raise ValueError("无法识别的文件编码，请确保是UTF-8或GBK")
+
+
+def _byte_chunk_bounds(data, chunk_bytes, encoding):
+    """
+    同 core.parallel_processor.chunk_bounds，但直接在字节上切：优先在预算后半段的换行处切开，
+    找不到时在预算内最后一个完整字符之后硬切
+    """
+    length = len(data)
+    start = 0
+    while start < length:
+        end = start + chunk_bytes
+        if end >= length:
+            yield start, length
+            return
+        cut = data.rfind(b'\n', start + chunk_bytes // 2, end) + 1
+        if not cut:
+            cut = end
+            if encoding == 'gbk':
+                cut = max(_GBK_CHARS.match(data, start, end).end(), start + 1)
+            elif encoding.startswith('utf-8'):
+                # 0b10xxxxxx 是多字节字符的后续字节
+                while cut > start + 1 and 0x80 <= data[cut] < 0xC0:
+                    cut -= 1
+        yield start, cut
+        start = cut
+
+
+class _CountingReader:
+    """记录已读取的解压后字节数，用于估算 .docx 的读取进度"""
+
+    def __init__(self, fp):
+        self.fp = fp
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        data = self.fp.read(size)
+        self.bytes_read += len(data)
+        return data
+
+
+def _docx_main_part(archive):
+    """主文档在压缩包内的路径 (由 _rels/.rels 指定，通常为 word/document.xml)"""
+    try:
+        relationships = etree.fromstring(archive.read('_rels/.rels'))
+    except KeyError:
+        return 'word/document.xml'
+    for relationship in relationships:
+        if relationship.get('Type') == _DOCX_MAIN_RELATIONSHIP:
+            return posixpath.normpath(relationship.get('Target').lstrip('/'))
+    return 'word/document.xml'
+
+
+def _docx_paragraph_text(paragraph):
+    parts = []
+    for element in paragraph.iter(_W + 't', _W + 'tab', _W + 'ptab', _W + 'br', _W + 'cr', _W + 'noBreakHyphen'):
+        # w:tab 也用于段落属性中的制表位，只取 w:r 中的
+        if element.getparent().tag != _W + 'r':
+            continue
+        if element.tag == _W + 't':
+            parts.append(element.text or '')
+        elif element.tag == _W + 'br':
+            if element.get(_W + 'type', 'textWrapping') == 'textWrapping':
+                parts.append('\n')
+        else:
+            parts.append(_DOCX_RUN_TEXT[element.tag])
+    return ''.join(parts)
+
+
+def _open_pdf(path, text_only):
+    """
+    text_only：用 pdfium 直接取文字层，跳过 pdfplumber 的逐字符版面分析 (快数十倍，换行与空格可能略有不同)
+    """
+    return pypdfium2.PdfDocument(path) if text_only else pdfplumber.open(path)
+
+
+def _pdf_page_count(document, text_only):
+    return len(document) if text_only else len(document.pages)
+
+
+def _extract_pdf_pages(document, start, end, text_only):
+    """提取 [start, end) 页的文字，按页序返回列表 (无文字的页为空字符串)"""
+    texts = []
+    for i in range(start, end):
+        if text_only:
+            page = document[i]
+            text_page = page.get_textpage()
+            texts.append(text_page.get_text_range().replace('\r\n', '\n'))
+            text_page.close()
+        else:
+            page = document.pages[i]
+            texts.append(page.extract_text() or '')
+        # 释放页面解析缓存，保持内存平稳
+        page.close()
+    return texts
+
+
+def _init_pdf_worker(path, text_only):
+    """子进程初始化：每个进程只打开一次 PDF"""
+    global _pdf_worker_state
+    _pdf_worker_state = (_open_pdf(path, text_only), text_only)
+
+
+def _pdf_worker_task(bounds):
+    document, text_only = _pdf_worker_state
+    return _extract_pdf_pages(document, bounds[0], bounds[1], text_only)
+
 
 class FileLoader:
     @staticmethod
-    def read_file(file_path):
+    def read_file(file_path, on_progress=None, pdf_text_only=False, info=None):
         """
         统一的文件读取接口
         :param file_path: 文件路径
+        :param on_progress: PDF 逐页进度回调，参数为 (已完成页数, 总页数)
+        :param pdf_text_only: PDF 只取文字层，跳过版面分析 (见 _open_pdf)
+        :param info: 可选的字典，读取 .txt 时写入识别出的编码 ("encoding")
         :return: 读取到的文本内容 (str)
         """
         if not os.path.exists(file_path):
@@ -18,11 +193,11 @@ class FileLoader:
 
         try:
             if ext == '.txt':
-                return FileLoader._read_txt(file_path)
+                return FileLoader._read_txt(file_path, info)
             elif ext == '.docx':
                 return FileLoader._read_docx(file_path)
             elif ext == '.pdf':
-                return FileLoader._read_pdf(file_path)
+                return FileLoader._read_pdf(file_path, on_progress, pdf_text_only)
             elif ext == '.doc':
                 return "错误: 不支持直接读取 .doc 格式，请先另存为 .docx 或 .txt"
             else:
@@ -31,34 +206,226 @@ class FileLoader:
             return f"读取失败: {str(e)}"
 
     @staticmethod
-    def _read_txt(path):
-        # 尝试常见编码读取
-        encodings = ['utf-8', 'gbk', 'utf-16']
-        for enc in encodings:
-            try:
-                with open(path, 'r', encoding=enc) as f:
-                    return f.read()
-            except UnicodeDecodeError:
-                continue
-        raise ValueError("无法识别的文件编码，请确保是UTF-8或GBK")
+    def collect_files(paths):
+        """
+        语料模式：把选中的文件与文件夹 (递归) 展开为可读取的文档列表
+        文件夹中只收录 CORPUS_EXTENSIONS 类型，跳过隐藏文件与 Word 的临时文件 (~$ 开头)
+        :return: 去重后按路径排序的文件列表
+        """
+        files = set()
+        for path in paths:
+            if os.path.isdir(path):
+                for root, dirs, names in os.walk(path):
+                    dirs[:] = [d for d in dirs if not d.startswith('.')]
+                    for name in names:
+                        if name.startswith(('.', '~$')) or os.path.splitext(name)[1].lower() not in CORPUS_EXTENSIONS:
+                            continue
+                        files.add(os.path.join(root, name))
+            elif os.path.isfile(path):
+                files.add(path)
+            else:
+                raise FileNotFoundError(f"文件未找到: {path}")
+        return sorted(files)
+
+    @staticmethod
+    def extractor_version(file_path, pdf_text_only=False):
+        """
+        文字提取方式的标识：提取结果会变化时 (例如换了提取方式) 随之改变，供分词缓存键使用
+        """
+        ext = os.path.splitext(file_path)[1].lower()
+        if ext == '.docx':
+            # 流式提取，包含表格单元格与文本框中的文字
+            return "docx-stream"
+        if ext == '.pdf' and pdf_text_only:
+            return "pdf-text-only"
+        return ""
+
+    @staticmethod
+    def iter_blocks(file_path, block_bytes=STREAM_BLOCK_BYTES, pdf_text_only=False):
+        """
+        流式读取接口：逐块产出文本，内存占用与文件大小无关
+        :param file_path: 文件路径
+        :param block_bytes: 每次读取的字节数 (仅 .txt 有效)
+        :param pdf_text_only: 同 read_file
+        :return: 生成器，产出 (文本块, 已消耗的文件字节数)
+        """
+        if not os.path.exists(file_path):
+            raise FileNotFoundError(f"文件未找到: {file_path}")
+
+        ext = os.path.splitext(file_path)[1].lower()
+        if ext == '.txt':
+            return FileLoader._iter_txt(file_path, block_bytes)
+        elif ext == '.docx':
+            return FileLoader._iter_docx(file_path)
+        elif ext == '.pdf':
+            return FileLoader._iter_pdf(file_path, pdf_text_only)
+        elif ext == '.doc':
+            raise ValueError("不支持直接读取 .doc 格式，请先另存为 .docx 或 .txt")
+        else:
+            raise ValueError("不支持的文件格式")
+
+    @staticmethod
+    def map_text_ranges(file_path, chunk_chars):
+        """
+        内存映射方式划分 .txt 的分词块：不解码全文，只在换行字节处切开，
+        由分词子进程各自读取、解码自己的字节范围 (见 ParallelTokenizer.run_mapped)，父进程不持有文本
+        :param chunk_chars: 每块的目标字符数，按样本估算的每字符字节数换算成字节预算
+        :return: (编码, [(起始字节, 结束字节), ...])；不是 .txt、文件为空或编码不能按字节找换行 (UTF-16) 时返回 None
+        """
+        if os.path.splitext(file_path)[1].lower() != '.txt' or os.path.getsize(file_path) == 0:
+            return None
+        with open(file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            found = _NON_ASCII.search(data)
+            if found is None:
+                encoding, sample = 'ascii', b''
+            else:
+                start = found.start() & ~1
+                sample = data[start:start + ENCODING_SAMPLE_BYTES]
+                encoding = _detect_encoding(sample, at_start=start == 0)
+            if encoding not in MAPPABLE_ENCODINGS:
+                return None
+            sample_chars = len(sample.decode(encoding, errors='replace')) if sample else 0
+            chunk_bytes = max(1, chunk_chars * len(sample) // sample_chars) if sample_chars else chunk_chars
+            return encoding, list(_byte_chunk_bounds(data, chunk_bytes, encoding))
+
+    @staticmethod
+    def _iter_decoded(path, block_bytes, info=None):
+        """
+        只读一遍文件，用增量解码器逐块解码
+        编码由样本判断 (见 _detect_encoding)，不再为每种候选编码都完整读一遍文件；
+        开头全是 ASCII 时先按 ASCII 解码 (UTF-8/GBK 的公共部分)，等出现非 ASCII 字节再取样判断
+        确定编码后个别无法解码的字节替换为 U+FFFD，不因末尾的一个坏字节整篇重读
+        :return: 生成器，产出 (文本, 已消耗的文件字节数)；换行统一为 \n (同文本方式打开文件)
+        """
+        decoder = None
+        newlines = io.IncrementalNewlineDecoder(None, translate=True)
+        consumed = 0
+        with open(path, 'rb') as f:
+            while True:
+                raw = f.read(block_bytes)
+                if decoder is None:
+                    found = _NON_ASCII.search(raw)
+                    if found:
+                        # 从第一个非 ASCII 字节处取样；对齐到偶数位置，保证 UTF-16 的字节序判断不错位
+                        start = found.start() & ~1
+                        encoding = _detect_encoding(raw[start:start + ENCODING_SAMPLE_BYTES],
+                                                    at_start=consumed + start == 0)
+                        decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+                        if info is not None:
+                            info["encoding"] = encoding
+                consumed += len(raw)
+                text = decoder.decode(raw, final=not raw) if decoder else raw.decode('ascii')
+                text = newlines.decode(text, final=not raw)
+                if text:
+                    yield text, consumed
+                if not raw:
+                    break
+        if decoder is None and info is not None:
+            info["encoding"] = 'ascii'
+
+    @staticmethod
+    def _iter_txt(path, block_bytes):
+        pending = ""
+        consumed = 0
+        for text, consumed in FileLoader._iter_decoded(path, block_bytes):
+            text = pending + text
+            # 在最后一个换行处切开，避免把一个词拆到两个块里
+            cut = text.rfind('\n') + 1
+            if cut:
+                pending = text[cut:]
+                yield text[:cut], consumed
+            else:
+                pending = text
+        if pending:
+            yield pending, consumed
+
+    @staticmethod
+    def _iter_docx(path):
+        total = os.path.getsize(path)
+        for text, progress in FileLoader.iter_docx_paragraphs(path):
+            yield text + '\n', int(total * progress)
+
+    @staticmethod
+    def iter_docx_paragraphs(path):
+        """
+        流式提取 .docx 的文字：直接从压缩包中逐段解析主文档 XML，不构建 python-docx 的完整文档对象
+        按文档顺序产出每个段落，包括表格单元格、文本框中的段落；处理完的元素立即清除，内存占用与文档大小无关
+        :return: 生成器，产出 (段落文字, 已读取的比例 0-1)
+        """
+        with zipfile.ZipFile(path) as archive:
+            part = _docx_main_part(archive)
+            size = max(archive.getinfo(part).file_size, 1)
+            with archive.open(part) as fp:
+                reader = _CountingReader(fp)
+                for _, paragraph in etree.iterparse(reader, events=('end',), tag=_W + 'p', huge_tree=True):
+                    text = _docx_paragraph_text(paragraph)
+                    # 🟢 清空已处理的段落并删掉它之前的兄弟元素 (表格、已处理的段落)，解析树不随文档增长
+                    paragraph.clear(keep_tail=True)
+                    while paragraph.getprevious() is not None:
+                        del paragraph.getparent()[0]
+                    yield text, min(reader.bytes_read / size, 1.0)
+
+    @staticmethod
+    def _iter_pdf(path, text_only=False):
+        total = os.path.getsize(path)
+        for page_text, done, count in FileLoader.iter_pdf_pages(path, text_only):
+            yield (page_text + '\n') if page_text else '', total * done // count
+
+    @staticmethod
+    def iter_pdf_pages(path, text_only=False, processes=None):
+        """
+        按页序逐页产出 PDF 文字
+        页数较多时按 PDF_PAGES_PER_TASK 页一段分给多个进程并行提取，结果仍按原页序产出
+        :param processes: 进程数，默认等于 CPU 核数；在进程池的子进程中 (例如语料模式) 始终串行
+        :return: 生成器，产出 (页面文字, 已完成页数, 总页数)
+        """
+        document = _open_pdf(path, text_only)
+        try:
+            count = _pdf_page_count(document, text_only)
+            if current_process().daemon:
+                # 进程池的子进程不能再创建子进程
+                processes = 1
+            processes = min(processes or cpu_count(), -(-count // PDF_PAGES_PER_TASK))
+            if count < PDF_PARALLEL_MIN_PAGES or processes <= 1:
+                for i in range(count):
+                    yield _extract_pdf_pages(document, i, i + 1, text_only)[0], i + 1, count
+                return
+        finally:
+            document.close()
+
+        bounds = [(start, min(count, start + PDF_PAGES_PER_TASK)) for start in range(0, count, PDF_PAGES_PER_TASK)]
+        pool = Pool(processes=processes, initializer=_init_pdf_worker, initargs=(path, text_only))
+        try:
+            done = 0
+            # imap 按提交顺序返回结果，各段并行提取
+            for texts in pool.imap(_pdf_worker_task, bounds):
+                for page_text in texts:
+                    done += 1
+                    yield page_text, done, count
+        finally:
+            pool.terminate()
+            pool.join()
+
+    @staticmethod
+    def _read_txt(path, info=None):
+        # 🟢 编码由样本判断，整个文件只读取、解码一遍
+        return "".join(text for text, _ in FileLoader._iter_decoded(path, STREAM_BLOCK_BYTES, info))
 
     @staticmethod
     def _read_docx(path):
-        doc = docx.Document(path)
-        full_text = []
-        for para in doc.paragraphs:
-            full_text.append(para.text)
-        return '\n'.join(full_text)
+        return '\n'.join(text for text, _ in FileLoader.iter_docx_paragraphs(path))
 
     @staticmethod
-    def _read_pdf(path):
-        text = ""
-        with pdfplumber.open(path) as pdf:
-            for page in pdf.pages:
-                page_text = page.extract_text()
-                if page_text:
-                    text += page_text + "\n"
-        return text
+    def _read_pdf(path, on_progress=None, text_only=False):
+        # 🟢 先收集再一次拼接，避免逐页 text += ... 的平方级复制
+        parts = []
+        for page_text, done, count in FileLoader.iter_pdf_pages(path, text_only):
+            if page_text:
+                parts.append(page_text)
+                parts.append("\n")
+            if on_progress:
+                on_progress(done, count)
+        return "".join(parts)
 
 if __name__ == "__main__":
     print("FileLoader 模块已准备就绪。")
\ No newline at end of file
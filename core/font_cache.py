@@ -0,0 +1,141 @@
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from PIL import ImageFont
+
+# 最多缓存多少个字体对象：每个 (字体文件, 字号, 使用线程) 一个原字体，外加横排/竖排两个包装对象，
+# 8K 排版会用到几百个字号；字体以文件路径打开，FreeType 按需读取，单个对象占用很小
+DEFAULT_MAX_FONTS = 1536
+# 最多缓存多少条文字外框
+DEFAULT_MAX_BBOXES = 200000
+
+
+class _CachedTransposedFont(ImageFont.TransposedFont):
+    """外框 (getbbox) 查询走 FontCache 的 TransposedFont，栅格化 (getmask2) 不变"""
+
+    def __init__(self, font, orientation, cache, key):
+        super().__init__(font, orientation=orientation)
+        self._cache = cache
+        self._key = key
+
+    def getbbox(self, text, *args, **kwargs):
+        return self._cache.bbox(self, text, args, kwargs)
+
+
+class _WordCloudImageFont:
+    """
+    替换 wordcloud.wordcloud 模块中的 ImageFont：
+    truetype / TransposedFont 改从 FontCache 取，其余属性直接转发给 PIL.ImageFont
+    """
+
+    def __init__(self, cache):
+        self._cache = cache
+
+    def truetype(self, font=None, size=10, *args, **kwargs):
+        if args or kwargs or not isinstance(font, str):
+            return ImageFont.truetype(font, size, *args, **kwargs)
+        return self._cache.truetype(font, size)
+
+    def TransposedFont(self, font, orientation=None):
+        key = getattr(font, "_font_cache_key", None)
+        if key is None:
+            return ImageFont.TransposedFont(font, orientation=orientation)
+        font_path, size, owner = key
+        return self._cache.transposed(font_path, size, orientation, owner)
+
+    def __getattr__(self, name):
+        return getattr(ImageFont, name)
+
+
+class FontCache:
+    """
+    进程级字体与文字外框缓存 (均为 LRU，条数有上限)
+    - 字体：按 (字体文件, 字号) 复用 FreeType 字体对象，msyh.ttc 这类大字体集合不再每个字号都重新解析
+    - 外框：按 (字体, 字号, 方向, 词, 参数) 记住 getbbox 的结果，排版时反复试字号不再重复测量
+    FreeType 字体对象不能多线程同时使用：需要并行使用时传入 owner (例如线程号)，每个 owner 各持一份
+    """
+
+    def __init__(self, max_fonts=DEFAULT_MAX_FONTS, max_bboxes=DEFAULT_MAX_BBOXES):
+        self.max_fonts = max_fonts
+        self.max_bboxes = max_bboxes
+        self._fonts = OrderedDict()
+        self._bboxes = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"font_hits": 0, "font_misses": 0, "bbox_hits": 0, "bbox_misses": 0}
+
+    def truetype(self, font_path, size, owner=None):
+        return self._get_font(("truetype", font_path, size, owner))
+
+    def transposed(self, font_path, size, orientation=None, owner=None):
+        """同 ImageFont.TransposedFont(ImageFont.truetype(font_path, size), orientation)"""
+        return self._get_font(("transposed", font_path, size, owner, orientation))
+
+    def bbox(self, font, text, args=(), kwargs=None):
+        key = (font._key, text, args, tuple(sorted(kwargs.items())) if kwargs else ())
+        with self._lock:
+            box = self._bboxes.pop(key, None)
+            if box is not None:
+                self._bboxes[key] = box
+                self._counters["bbox_hits"] += 1
+                return box
+            self._counters["bbox_misses"] += 1
+
+        box = ImageFont.TransposedFont.getbbox(font, text, *args, **(kwargs or {}))
+        with self._lock:
+            self._bboxes[key] = box
+            while len(self._bboxes) > self.max_bboxes:
+                self._bboxes.popitem(last=False)
+        return box
+
+    def stats(self):
+        """累计命中计数；hit_rate 为 None 表示尚无查询"""
+        with self._lock:
+            stats = dict(self._counters)
+            stats["fonts"] = len(self._fonts)
+            stats["bboxes"] = len(self._bboxes)
+        for kind in ("font", "bbox"):
+            total = stats[f"{kind}_hits"] + stats[f"{kind}_misses"]
+            stats[f"{kind}_hit_rate"] = stats[f"{kind}_hits"] / total if total else None
+        return stats
+
+    @contextmanager
+    def patch_wordcloud(self):
+        """排版期间让 wordcloud 库通过本缓存创建字体 (可嵌套)"""
+        import wordcloud.wordcloud as wordcloud_module
+        previous = wordcloud_module.ImageFont
+        wordcloud_module.ImageFont = _WordCloudImageFont(self)
+        try:
+            yield
+        finally:
+            wordcloud_module.ImageFont = previous
+
+    def _get_font(self, key, count=True):
+        with self._lock:
+            font = self._fonts.pop(key, None)
+            if font is not None:
+                self._fonts[key] = font
+                if count:
+                    self._counters["font_hits"] += 1
+                return font
+            if count:
+                self._counters["font_misses"] += 1
+
+        kind, font_path, size, owner = key[:4]
+        if kind == "truetype":
+            font = ImageFont.truetype(font_path, size)
+            # 供 _WordCloudImageFont.TransposedFont 找回缓存键
+            font._font_cache_key = (font_path, size, owner)
+        else:
+            base = self._get_font(("truetype", font_path, size, owner), count=False)
+            font = _CachedTransposedFont(base, key[4], self, key)
+
+        with self._lock:
+            self._fonts[key] = font
+            while len(self._fonts) > self.max_fonts:
+                self._fonts.popitem(last=False)
+        return font
+
+
+# 🟢 进程内共用的缓存：WordCloudGenerator 每次生成都会重新创建，缓存需跨生成保留
+FONT_CACHE = FontCache()
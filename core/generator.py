@@ -1,11 +1,295 @@
 import numpy as np
 from wordcloud import WordCloud
-from PIL import Image
+from PIL import Image, ImageChops, ImageDraw, ImageFilter
+import math
 import os
+import time
+import re
+from collections import defaultdict
+from operator import itemgetter
+
+from core.font_cache import FONT_CACHE
+from core.mask_cache import MaskCache
+from core.png_stream import PngStreamWriter
+from core.rasterizer import bucket_items, rasterize
+from core.svg_export import write_svg
+
+# 蒙版阈值：不透明度高于该值且亮度低于 MASK_DARK_THRESHOLD 的像素视为可绘制区域
+MASK_ALPHA_THRESHOLD = 128
+MASK_DARK_THRESHOLD = 220
+
+# 超过该像素数 (1080P) 时改为缩小排版、放大绘制
+DEFAULT_LAYOUT_PIXELS = 1920 * 1080
+# 布局字号不超过 min_font_size 的该倍数时，放大绘制前检查碰撞
+REFINE_FONT_FACTOR = 3
+
+# 预览图宽度 (像素) 与排版过程中的预览间隔 (秒)
+PREVIEW_WIDTH = 800
+PREVIEW_INTERVAL = 1.0
+
+# 内存估算：各阶段每像素占用的字节数
+# 排版：蒙版、积分图 (WordCloud 内部 cumsum 的 int64 中间结果) 与占用图，按排版画布计
+LAYOUT_BYTES_PER_PIXEL = 32
+# 全分辨率蒙版 (RGBA 缩放与阈值判断) 与轮廓层的中间图，按输出尺寸计
+CONTOUR_BYTES_PER_PIXEL = 10
+# 界面显示：ImageQt 与 QPixmap 各一份 32 位图
+DISPLAY_BYTES_PER_PIXEL = 8
+# 透明化后处理与逐条写 PNG 时每条的行数
+STRIP_ROWS = 512
+
+# 透明模式下视为背景白的阈值：通道值 > 250 映射为 255 (需清除)，其余为 0
+_WHITE_LUT = [0] * 251 + [255] * 5
+# 非零像素映射为 255
+_NONZERO_LUT = [0] + [255] * 255
+
+
+class _ScaledWordCloud(WordCloud):
+    """
+    在 WordCloud 基础上：
+    - 轮廓层可从 MaskCache 读取，并可改用全分辨率蒙版计算 (低分辨率布局放大后轮廓不发虚)
+    - 低分辨率布局放大绘制时，可在全分辨率下微调容易碰撞的小号词
+    - 最终图片可交给 TileRasterizer 分块并行绘制
+    """
+
+    mask_cache = None
+    # 轮廓缓存键 (计算轮廓所用蒙版的键)，为 None 时不缓存
+    contour_key = None
+    # 无参函数，返回计算轮廓用的蒙版；为 None 时使用布局蒙版
+    contour_mask = None
+    # 放大绘制时是否微调小号词
+    refine_small_words = False
+    # 输出图片尺寸 (宽, 高)，即请求的目标尺寸；为 None 时按布局尺寸乘 scale 计算
+    output_shape = None
+    # 分块并行绘制器 (TileRasterizer)，为 None 时串行绘制
+    rasterizer = None
+    # 预览回调 (参数为 PIL.Image)：排版过程中定时、排版完成后各发出一次低分辨率预览
+    on_preview = None
+    # 当前 generate_from_frequencies 的嵌套深度 (WordCloud 会先递归排两个词来估算最大字号)
+    _layout_depth = 0
+
+    def generate_from_frequencies(self, frequencies, max_font_size=None):
+        # 🟢 排版时反复试字号：字体对象与文字外框走进程级缓存
+        with FONT_CACHE.patch_wordcloud():
+            if self.on_preview is None or self._layout_depth:
+                self._layout_depth += 1
+                try:
+                    return super().generate_from_frequencies(frequencies, max_font_size)
+                finally:
+                    self._layout_depth -= 1
+
+            # 借 color_func 的调用 (每放下一个词调用一次) 记录排版进度，预览与最终结果是同一份排版
+            preview = _LayoutPreview(self, self.color_func)
+            self.color_func = preview
+            self._layout_depth = 1
+            try:
+                result = super().generate_from_frequencies(frequencies, max_font_size)
+            finally:
+                self.color_func = preview.color_func
+                self._layout_depth = 0
+            preview.emit()
+            return result
+
+    def to_image(self):
+        self._check_generated()
+        size = self.output_size()
+        items = self._draw_items(size)
+        if self.rasterizer is not None:
+            img = self.rasterizer.render(self.mode, size, self.background_color, self.font_path, items)
+        else:
+            img = rasterize(self.mode, size, self.background_color, self.font_path, items)
+        return self._draw_contour(img=img)
+
+    def output_size(self):
+        """输出图片尺寸 (宽, 高)"""
+        if self.output_shape is not None:
+            # scale 只按宽度换算，直接取整会让高度差一两个像素
+            return self.output_shape
+        if self.mask is not None:
+            height, width = self.mask.shape
+        else:
+            height, width = self.height, self.width
+        return int(width * self.scale), int(height * self.scale)
+
+    def to_preview(self):
+        """只绘制 PREVIEW_WIDTH 宽的预览图 (不带轮廓)，供只需矢量输出时显示"""
+        self._check_generated()
+        return _LayoutPreview.render(self, [(word, font_size, position, orientation, color)
+                                            for (word, _), font_size, position, orientation, color in self.layout_])
+
+    def write_svg(self, fp, embed_font=False):
+        """
+        直接从排版结果写出 SVG (位置与 to_image 一致，含微调)，不绘制位图
+        轮廓层是位图，SVG 中不包含
+        """
+        self._check_generated()
+        size = self.output_size()
+        write_svg(fp, size, self.background_color, self.font_path, self._draw_items(size), embed_font)
+
+    def _draw_items(self, size):
+        """
+        把布局放大到输出尺寸，得到绘制列表 [(词, 字号, 方向, (x, y), 颜色)]
+        (字号与位置的取整方式同 WordCloud.to_image)
+        开启微调时，小号词先在全分辨率的占用图上检查碰撞：字号取整导致与已绘制的词重叠时，
+        在附近几个像素内找一个不重叠的位置
+        """
+        refine = self.refine_small_words and self.scale != 1
+        if refine:
+            occupancy = Image.new("L", size, 0)
+            occupancy_draw = ImageDraw.Draw(occupancy)
+            # 布局字号不超过该值的词视为容易碰撞的小号词
+            small_font_size = self.min_font_size * REFINE_FONT_FACTOR
+            radius = max(1, int(round(self.margin * self.scale)))
+            # 候选偏移按距离由近到远排列
+            offsets = sorted(((dx, dy) for dx in range(-radius, radius + 1) for dy in range(-radius, radius + 1)),
+                             key=lambda d: d[0] * d[0] + d[1] * d[1])
+
+        items = []
+        for (word, count), font_size, position, orientation, color in self.layout_:
+            scaled_size = int(font_size * self.scale)
+            pos = (int(position[1] * self.scale), int(position[0] * self.scale))
+            if refine:
+                font = FONT_CACHE.transposed(self.font_path, scaled_size, orientation)
+                if font_size <= small_font_size:
+                    pos = self._free_position(occupancy, word, font, pos, offsets, radius)
+                occupancy_draw.text(pos, word, fill=255, font=font)
+            items.append((word, scaled_size, orientation, pos, color))
+        return items
+
+    @staticmethod
+    def _free_position(occupancy, word, font, pos, offsets, radius):
+        """在 pos 周围 radius 像素内按 offsets 顺序找与已绘制内容不重叠的位置，找不到时保持原位"""
+        left, top, right, bottom = ImageDraw.Draw(occupancy).textbbox(pos, word, font=font)
+        if right <= left or bottom <= top:
+            return pos
+        glyph = Image.new("L", (right - left, bottom - top), 0)
+        ImageDraw.Draw(glyph).text((pos[0] - left, pos[1] - top), word, fill=255, font=font)
+        glyph = np.asarray(glyph) > 0
+
+        # 只取词周围的一小块占用图，避免每个词都复制整张大图
+        width, height = occupancy.size
+        area = occupancy.crop((left - radius, top - radius, right + radius, bottom + radius))
+        area = np.asarray(area) > 0
+        h, w = glyph.shape
+
+        for dx, dy in offsets:
+            if left + dx < 0 or top + dy < 0 or right + dx > width or bottom + dy > height:
+                continue
+            region = area[radius + dy:radius + dy + h, radius + dx:radius + dx + w]
+            if not np.any(region & glyph):
+                return pos[0] + dx, pos[1] + dy
+        return pos
+
+    def _draw_contour(self, img):
+        contour = self.contour_layer(img.size)
+        if contour is None:
+            return img
+        # 与 WordCloud._draw_contour 的着色结果相同，但直接在原图上填色
+        img.paste(self.contour_color, mask=Image.fromarray(contour))
+        return img
+
+    def contour_layer(self, size):
+        """轮廓层 (0/255 的 uint8 数组)，不画轮廓时为 None"""
+        if self.mask is None or self.contour_width == 0:
+            return None
+        if self.mask_cache is not None and self.contour_key is not None:
+            key = MaskCache.make_key("contour", self.contour_key, list(size), self.contour_width)
+            return self.mask_cache.get(key, lambda: self._compute_contour(size))
+        return self._compute_contour(size)
+
+    def _compute_contour(self, size):
+        """同 WordCloud._draw_contour 的轮廓计算，返回 0/255 的 uint8 数组"""
+        source = self.contour_mask() if self.contour_mask is not None else self.mask
+        # 🟢 全程使用 uint8：布尔数组直接乘 255 会得到 8 字节一个像素的 int64 数组
+        mask = self._get_bolean_mask(source).astype(np.uint8)
+        mask *= 255
+        contour = Image.fromarray(mask)
+        contour = contour.resize(size)
+        contour = contour.filter(ImageFilter.FIND_EDGES)
+        contour = np.array(contour)
+
+        # 边框不画轮廓
+        contour[[0, -1], :] = 0
+        contour[:, [0, -1]] = 0
+
+        # 用高斯模糊控制轮廓宽度
+        contour = Image.fromarray(contour)
+        contour = contour.filter(ImageFilter.GaussianBlur(radius=self.contour_width / 10))
+        return np.array(contour.point(_NONZERO_LUT))
+
+
+class _LayoutPreview:
+    """
+    包装 WordCloud 的 color_func：记录已放下的词，每隔 PREVIEW_INTERVAL 秒画一张低分辨率预览。
+    WordCloud 按字号从大到小依次放词，中途的预览就是最终结果里最醒目的那部分
+    """
+
+    def __init__(self, wc, color_func):
+        self.wc = wc
+        self.color_func = color_func
+        self.items = []
+        self.last_emit = time.perf_counter()
+
+    def __call__(self, word, font_size, position, orientation, **kwargs):
+        color = self.color_func(word, font_size=font_size, position=position, orientation=orientation, **kwargs)
+        # 估算最大字号的内层排版不计入
+        if self.wc._layout_depth == 1:
+            self.items.append((word, font_size, position, orientation, color))
+            if time.perf_counter() - self.last_emit >= PREVIEW_INTERVAL:
+                self.emit()
+        return color
+
+    def emit(self):
+        self.wc.on_preview(self.render(self.wc, self.items))
+        self.last_emit = time.perf_counter()
+
+    @staticmethod
+    def render(wc, entries):
+        """
+        按 PREVIEW_WIDTH 宽度绘制低分辨率图片
+        :param entries: [(词, 布局字号, 布局位置 (y, x), 方向, 颜色)]
+        """
+        if wc.mask is not None:
+            height, width = wc.mask.shape
+        else:
+            height, width = wc.height, wc.width
+        ratio = min(1.0, PREVIEW_WIDTH / width)
+        size = (max(1, int(width * ratio)), max(1, int(height * ratio)))
+
+        items = []
+        for word, font_size, position, orientation, color in entries:
+            preview_size = int(font_size * ratio)
+            if preview_size >= 1:
+                items.append((word, preview_size, orientation,
+                              (int(position[1] * ratio), int(position[0] * ratio)), color))
+        return rasterize(wc.mode, size, wc.background_color, wc.font_path, items)
 
 
 class WordCloudGenerator:
-    def __init__(self, font_path=None):
+    def __init__(self, font_path=None, mask_cache=None, max_layout_pixels=DEFAULT_LAYOUT_PIXELS,
+                 refine_layout=False, rasterizer=None, vector_only=False,
+                 memory_budget=None, downscale_to_budget=True, reserve_display=False):
+        # 🟢 处理后蒙版与轮廓层的缓存 (MaskCache)，为 None 时每次重新计算
+        self.mask_cache = mask_cache
+        # 🟢 多分辨率布局：目标像素数超过该值时，在缩小的画布上排版、按比例放大绘制
+        # 布局耗时与画布面积成正比，8K 输出只需 1080P 的排版时间；None 表示始终全分辨率排版
+        self.max_layout_pixels = max_layout_pixels
+        # 放大绘制时在全分辨率下微调小号词，避免字号取整造成的重叠
+        self.refine_layout = refine_layout
+        # 🟢 最终图片的绘制器 (TileRasterizer)，为 None 时在当前线程串行绘制
+        self.rasterizer = rasterizer
+        # 只需矢量输出 (save_svg) 或逐条写 PNG (save_png) 时不绘制全分辨率图片，
+        # 生成结果改为 PREVIEW_WIDTH 宽的预览图
+        self.vector_only = vector_only
+        # 🟢 内存预算 (字节)：生成前估算峰值内存，超出时按比例缩小输出尺寸 (或拒绝生成)；None 表示不限制
+        self.memory_budget = memory_budget
+        self.downscale_to_budget = downscale_to_budget
+        # 估算时是否计入界面显示结果图片所需的内存 (见 DISPLAY_BYTES_PER_PIXEL)
+        self.reserve_display = reserve_display
+        # 上次生成的内存估算 (estimate_memory 的结果) 与缩小前的尺寸 (未缩小时为 None)
+        self.last_memory_estimate = None
+        self.downscaled_from = None
+        # 🟢 上次生成的 WordCloud (含排版结果 layout_)，供 recolor 只换配色/背景重新绘制
+        self.last_cloud = None
         self.font_path = font_path
         if not self.font_path:
             base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -21,107 +305,418 @@ class WordCloudGenerator:
                     print("警告：未找到默认中文字体！")
 
     def generate(self, text, mask_image_path=None, bg_color='white',
-                 max_words=200, color_map='viridis', width=800, height=600):
+                 max_words=200, color_map='viridis', width=800, height=600, on_preview=None):
         if not text or not text.strip():
             raise ValueError("文本内容为空")
 
-        mask = None
-        final_width, final_height = width, height
+        width, height = self._fit_memory_budget(width, height, mask_image_path, bg_color)
+        wc, is_transparent = self._create_wordcloud(mask_image_path, bg_color, max_words,
+                                                    color_map, width, height)
+        self._report_downscale(wc)
+        wc.on_preview = on_preview
+        wc.generate(text)
+        wc.on_preview = None
+        self.last_cloud = wc
+        return self._to_image(wc, is_transparent, self.vector_only)
+
+    def generate_from_frequencies(self, frequencies, mask_image_path=None, bg_color='white',
+                                  max_words=200, color_map='viridis', width=800, height=600,
+                                  on_preview=None):
+        """
+        直接根据 词->次数 映射生成词云，跳过 WordCloud 对全文的二次切分与计数
+        渲染耗时只与词表大小有关，与语料长度无关
+        :param frequencies: dict / Counter，例如并行分词得到的词频表
+        :param on_preview: 预览回调，参数为 PREVIEW_WIDTH 宽的 PIL.Image；
+                           排版过程中定时发出，排版完成、开始绘制全分辨率图片前再发出一次
+        """
+        if not frequencies:
+            raise ValueError("词频数据为空")
+
+        width, height = self._fit_memory_budget(width, height, mask_image_path, bg_color)
+        wc, is_transparent = self._create_wordcloud(mask_image_path, bg_color, max_words,
+                                                    color_map, width, height)
+        self._report_downscale(wc)
+        wc.on_preview = on_preview
+        cloud_freqs = self._normalize_frequencies(wc, frequencies)
+        if not cloud_freqs:
+            raise ValueError("没有可绘制的词语")
+        # generate_from_frequencies 内部会按词频排序并截取前 max_words 个
+        wc.generate_from_frequencies(cloud_freqs)
+        wc.on_preview = None
+        self.last_cloud = wc
+        return self._to_image(wc, is_transparent, self.vector_only)
+
+    def recolor(self, bg_color=None, color_map=None):
+        """
+        沿用上次的排版 (last_cloud)，只换配色或背景重新绘制，不再读取、分词与排版
+        :param bg_color: 新背景色 (含 "transparent")，None 表示不变
+        :param color_map: 新配色方案，None 或与上次相同时保留各词原有颜色
+        """
+        wc = self.last_cloud
+        if wc is None:
+            raise ValueError("没有可重新着色的词云，请先生成")
+
+        if color_map is not None and color_map != wc.colormap:
+            wc.recolor(colormap=color_map)
+            wc.colormap = color_map
+        if bg_color is not None:
+            is_transparent = self._apply_background(wc, bg_color)
+        else:
+            is_transparent = wc.mode == "RGBA"
+        return self._to_image(wc, is_transparent, self.vector_only)
+
+    def save_png(self, path, compress_level=6, optimize=False, on_progress=None):
+        """
+        把上次生成的词云逐条绘制并写成 PNG，全分辨率图片不会整张留在内存中
+        (峰值只有一条 STRIP_ROWS 行的图片加轮廓层)，结果与 generate 返回的图片逐像素一致
+        :param compress_level / optimize: 同 core.image_export.save_image
+        :param on_progress: 进度回调，参数为 0-100
+        """
+        wc = self.last_cloud
+        if wc is None:
+            raise ValueError("没有可导出的词云，请先生成")
+        is_transparent = wc.mode == "RGBA"
+        size = wc.output_size()
+        width, height = size
+        items = wc._draw_items(size)
+        contour = wc.contour_layer(size)
+        strips = bucket_items(wc.mode, size, wc.font_path, items, width, STRIP_ROWS)
 
-        # 1. 蒙版处理
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            writer = PngStreamWriter(f, size, "RGBA" if is_transparent else wc.mode, compress_level,
+                                     adaptive_filter=optimize)
+            for index, top in enumerate(range(0, height, STRIP_ROWS)):
+                strip_size = (width, min(STRIP_ROWS, height - top))
+                strip_items = strips.get((0, index), [])
+                if self.rasterizer is not None:
+                    strip = self.rasterizer.render(wc.mode, strip_size, wc.background_color, wc.font_path,
+                                                   strip_items, origin=(0, top))
+                else:
+                    strip = rasterize(wc.mode, strip_size, wc.background_color, wc.font_path,
+                                      strip_items, origin=(0, top))
+                if contour is not None:
+                    strip.paste(wc.contour_color, mask=Image.fromarray(contour[top:top + strip.height]))
+                if is_transparent:
+                    self._clear_white_background(strip)
+                writer.write_rows(strip)
+                if on_progress:
+                    on_progress((top + strip.height) * 100 // height)
+            writer.close()
+        os.replace(tmp_path, path)
+
+    def estimate_memory(self, width, height, mask_image_path=None, bg_color='white'):
+        """
+        估算按给定尺寸生成时的峰值内存 (字节)
+        :return: {"layout": 排版, "render": 绘制, "display": 界面显示, "peak": 峰值}
+        """
+        width, height = self._output_size(width, height, mask_image_path)
+        layout_width, layout_height, scale = self._layout_size(width, height)
+        pixels = width * height
+        is_transparent = bg_color == "transparent" or bg_color is None
+        channels = 4 if is_transparent else 3
+
+        layout = layout_width * layout_height * LAYOUT_BYTES_PER_PIXEL
+        # 只有实色背景加蒙版时才画轮廓
+        contour = pixels * CONTOUR_BYTES_PER_PIXEL if mask_image_path and not is_transparent else 0
+        # 微调用的全分辨率占用图 (L)，在分配画布前释放
+        refine = pixels if self.refine_layout and scale != 1 else 0
+        tiles = 0
+        if self.rasterizer is not None:
+            # 每个分块的图片与 (进程模式下) 回传的字节各一份
+            tiles = self.rasterizer.workers * self.rasterizer.tile_size ** 2 * channels * 2
+        # 一条的图片与通道运算的中间图
+        strip = width * STRIP_ROWS * channels * 3
+
+        if self.vector_only:
+            # 不保留整张图片：保存 PNG 时逐条绘制，常驻的只有轮廓层
+            render = max(refine, contour, (pixels if contour else 0) + strip + tiles)
+            display = 0
+        else:
+            canvas = pixels * channels
+            render = max(refine, canvas + tiles, canvas + contour, canvas + strip)
+            display = pixels * DISPLAY_BYTES_PER_PIXEL if self.reserve_display else 0
+        return {"layout": layout, "render": render, "display": display,
+                "peak": max(layout, render) + display}
+
+    def _fit_memory_budget(self, width, height, mask_image_path, bg_color):
+        """
+        预计峰值内存超出 memory_budget 时按比例缩小输出尺寸 (downscale_to_budget 为 False 时抛出 MemoryError)
+        :return: 实际使用的 (宽, 高)
+        """
+        self.downscaled_from = None
+        estimate = self.estimate_memory(width, height, mask_image_path, bg_color)
+        self.last_memory_estimate = estimate
+        if self.memory_budget is None or estimate["peak"] <= self.memory_budget:
+            return width, height
+
+        needed_mb = estimate["peak"] // (1024 * 1024)
+        budget_mb = self.memory_budget // (1024 * 1024)
+        if not self.downscale_to_budget:
+            raise MemoryError(f"{width}x{height} 预计需要 {needed_mb} MB 内存，超出预算 {budget_mb} MB，请降低分辨率")
+
+        factor = 1.0
+        new_width, new_height = width, height
+        while estimate["peak"] > self.memory_budget:
+            factor *= 0.9
+            new_width, new_height = max(1, int(width * factor)), max(1, int(height * factor))
+            if new_width * new_height < 640 * 480:
+                raise MemoryError(f"内存预算 {budget_mb} MB 过小，无法生成词云")
+            estimate = self.estimate_memory(new_width, new_height, mask_image_path, bg_color)
+
+        self.last_memory_estimate = estimate
+        self.downscaled_from = (width, height)
+        return new_width, new_height
+
+    def _report_downscale(self, wc):
+        """内存预算导致缩小时提示实际输出尺寸 (取自排版对象，与保存的图片一致)"""
+        if self.downscaled_from is None:
+            return
+        width, height = self.downscaled_from
+        new_width, new_height = wc.output_size()
+        budget_mb = self.memory_budget // (1024 * 1024)
+        print(f"内存预算 {budget_mb} MB：输出尺寸由 {width}x{height} 缩小为 {new_width}x{new_height}")
+
+    @staticmethod
+    def _output_size(width, height, mask_image_path):
+        """输出图片尺寸：有蒙版时为蒙版按比例缩放到 (width, height) 内的尺寸 (同 _prepare_mask)"""
         if mask_image_path and os.path.exists(mask_image_path):
             try:
-                original_mask = Image.open(mask_image_path).convert("RGBA")
-                orig_w, orig_h = original_mask.size
-
-                # 保持比例缩放
+                with Image.open(mask_image_path) as image:
+                    orig_w, orig_h = image.size
                 ratio = min(width / orig_w, height / orig_h)
-                new_w = int(orig_w * ratio)
-                new_h = int(orig_h * ratio)
-                final_width, final_height = new_w, new_h
+                return int(orig_w * ratio), int(orig_h * ratio)
+            except OSError:
+                pass
+        return width, height
+
+    def save_svg(self, path, embed_font=False):
+        """
+        把上次生成的词云保存为 SVG 矢量图，直接从排版结果写出，打印尺寸也不需要巨大的位图
+        :param embed_font: 嵌入只含已用字形的字体子集
+        """
+        wc = self.last_cloud
+        if wc is None:
+            raise ValueError("没有可导出的词云，请先生成")
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            wc.write_svg(f, embed_font=embed_font)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _normalize_frequencies(wc, frequencies):
+        """
+        按 WordCloud.process_text 的同一套规则 (collocations=False) 规整词频：
+        正则切分、去 's、去纯数字、英文停用词、大小写与复数合并。
+        结果与把词频展开成空格分隔文本再调用 generate(text) 完全一致，中文词原样保留
+        """
+        pattern = r"\w[\w']*" if wc.min_word_length <= 1 else r"\w[\w']+"
+        regexp = re.compile(wc.regexp if wc.regexp is not None else pattern)
+        stopwords = set(w.lower() for w in wc.stopwords)
 
-                resized_mask = original_mask.resize((final_width, final_height), Image.Resampling.LANCZOS)
-                icon_array = np.array(resized_mask)
+        # 小写形式 -> {原始大小写形式: 次数}
+        case_counts = defaultdict(dict)
+        for word, count in frequencies.items():
+            for token in regexp.findall(word):
+                if token.lower().endswith("'s"):
+                    token = token[:-2]
+                if not wc.include_numbers and token.isdigit():
+                    continue
+                if wc.min_word_length and len(token) < wc.min_word_length:
+                    continue
+                if token.lower() in stopwords:
+                    continue
+                cases = case_counts[token.lower()]
+                cases[token] = cases.get(token, 0) + count
 
-                # 创建 WordCloud 蒙版 (255白=背景, 0黑=内容)
-                new_mask = np.full((final_height, final_width), 255, dtype=np.uint8)
+        # 复数并入单数 (与 wordcloud.tokenization.process_tokens 相同)
+        if wc.normalize_plurals:
+            for key in list(case_counts.keys()):
+                if key.endswith('s') and not key.endswith("ss"):
+                    key_singular = key[:-1]
+                    if key_singular in case_counts:
+                        dict_singular = case_counts[key_singular]
+                        for word, count in case_counts.pop(key).items():
+                            singular = word[:-1]
+                            dict_singular[singular] = dict_singular.get(singular, 0) + count
 
-                # 智能判定：不透明 且 颜色深
-                is_opaque = icon_array[:, :, 3] > 128
-                brightness = np.mean(icon_array[:, :, :3], axis=2)
-                is_dark = brightness < 220
+        # 每个词取出现最多的大小写形式
+        fused = {}
+        for cases in case_counts.values():
+            first = max(cases.items(), key=itemgetter(1))[0]
+            fused[first] = sum(cases.values())
+        return fused
 
-                target_indices = np.logical_and(is_opaque, is_dark)
-                new_mask[target_indices] = 0
-                mask = new_mask
+    def _create_wordcloud(self, mask_image_path, bg_color, max_words, color_map, width, height):
+        """构建已配置好蒙版与背景模式的 WordCloud 对象"""
+        mask = None
+        mask_key = None
+        contour_mask = None
+        layout_width, layout_height, scale = self._layout_size(width, height)
+        final_width, final_height = layout_width, layout_height
+
+        # 1. 蒙版处理 (布局用缩小后的蒙版，轮廓用目标尺寸的蒙版)
+        if mask_image_path and os.path.exists(mask_image_path):
+            try:
+                mask_key, mask = self._load_mask(mask_image_path, layout_width, layout_height)
+                final_height, final_width = mask.shape
+                if scale != 1:
+                    contour_mask = lambda: self._load_mask(mask_image_path, width, height)[1]
+                    if mask_key is not None:
+                        mask_key = self._mask_key(mask_image_path, width, height)
 
             except Exception as e:
                 print(f"蒙版处理错误: {e}")
                 mask = None
 
-        # 2. 🟢 核心修复：模式分流策略
-        # 为了避免 wordcloud 库在 RGBA 模式下画轮廓报错：
-        # - 透明背景 -> RGBA 模式 -> 强制 contour_width=0
-        # - 实色背景 -> RGB 模式 -> 允许 contour_width>0
+        # 输出尺寸与目标一致：有蒙版时为蒙版按比例缩放到 (width, height) 内的尺寸，与轮廓层同大
+        output_width, output_height = (self._output_size(width, height, mask_image_path) if mask is not None
+                                       else (width, height))
 
-        is_transparent = False
-        wc_mode = "RGB"  # 默认 RGB (支持轮廓)
-        wc_bg_color = "white"  # 默认白
-        contour_w = 0
-
-        if bg_color == "transparent" or bg_color is None:
-            is_transparent = True
-            wc_mode = "RGBA"  # 必须 RGBA
-            wc_bg_color = None  # 背景 None
-            contour_w = 0  # ❌ 透明模式严禁轮廓，否则崩溃
-        else:
-            is_transparent = False
-            wc_mode = "RGB"  # 🟢 实色背景切回 RGB，稳！
-            wc_bg_color = bg_color
-            # 有蒙版且非透明时，才画轮廓
-            if mask is not None:
-                contour_w = 3  # 浅色轮廓宽度
-
-        # 3. 动态参数
-        dynamic_min_font = max(4, final_height // 150)
-        dynamic_step = 2 if final_height < 2000 else 3
+        # 2. 动态参数：按输出尺寸确定 (与全分辨率排版相同)，再换算到排版画布的像素，
+        # 否则放大后词间距、最小字号和字号步长都会乘上 scale，放下的词明显变少
+        dynamic_min_font = max(4, output_height // 150)
+        dynamic_step = 2 if output_height < 2000 else 3
+        # 步长向下取整，放大后不比全分辨率排版更粗；排版画布上最少 1 像素
+        layout_margin = max(1, round(2 / scale))
+        layout_min_font = max(1, round(dynamic_min_font / scale))
+        layout_step = max(1, int(dynamic_step / scale))
 
         params = {
             "font_path": self.font_path,
-            "background_color": wc_bg_color,
-            "mode": wc_mode,
+            "scale": scale,
             "max_words": max_words,
             "width": final_width,
             "height": final_height,
             "colormap": color_map,
             "collocations": False,
-            "margin": 2,
+            "margin": layout_margin,
             "mask": mask,
-            "contour_width": contour_w,
             "contour_color": '#CCCCCC',  # 浅灰色轮廓
-            "min_font_size": dynamic_min_font,
-            "font_step": dynamic_step,
+            "min_font_size": layout_min_font,
+            "font_step": layout_step,
             "relative_scaling": 0.5,
             "prefer_horizontal": 0.9
         }
 
-        wc = WordCloud(**params)
-        wc.generate(text)
+        wc = _ScaledWordCloud(**params)
+        # 3. 背景模式 (绘制前才用到，recolor 时可单独更换)
+        is_transparent = self._apply_background(wc, bg_color)
+        wc.mask_cache = self.mask_cache
+        wc.contour_key = mask_key
+        wc.contour_mask = contour_mask
+        wc.refine_small_words = self.refine_layout
+        wc.rasterizer = self.rasterizer
+        wc.output_shape = (output_width, output_height)
+        return wc, is_transparent
+
+    @staticmethod
+    def _apply_background(wc, bg_color):
+        """
+        设置背景色、颜色模式与轮廓宽度
+        :return: 是否为透明背景
+        """
+        # 🟢 核心修复：模式分流策略
+        # 为了避免 wordcloud 库在 RGBA 模式下画轮廓报错：
+        # - 透明背景 -> RGBA 模式 -> 强制 contour_width=0
+        # - 实色背景 -> RGB 模式 -> 允许 contour_width>0
+        if bg_color == "transparent" or bg_color is None:
+            wc.mode = "RGBA"  # 必须 RGBA
+            wc.background_color = None  # 背景 None
+            wc.contour_width = 0  # ❌ 透明模式严禁轮廓，否则崩溃
+            return True
+
+        wc.mode = "RGB"  # 🟢 实色背景切回 RGB，稳！
+        wc.background_color = bg_color
+        # 有蒙版且非透明时，才画轮廓 (浅色轮廓宽度 3)
+        wc.contour_width = 3 if wc.mask is not None else 0
+        return False
+
+    def _layout_size(self, width, height):
+        """
+        排版画布尺寸与放大倍数
+        :return: (排版宽, 排版高, scale)，放大后的宽度与目标宽度一致
+        """
+        if not self.max_layout_pixels or width * height <= self.max_layout_pixels:
+            return width, height, 1
+        factor = math.sqrt(width * height / self.max_layout_pixels)
+        layout_width = max(1, round(width / factor))
+        layout_height = max(1, round(height / factor))
+        return layout_width, layout_height, width / layout_width
 
-        image = wc.to_image()
+    def _mask_key(self, mask_image_path, width, height):
+        stat = os.stat(mask_image_path)
+        return MaskCache.make_key(
+            "mask", os.path.abspath(mask_image_path), stat.st_mtime_ns, stat.st_size,
+            width, height, MASK_ALPHA_THRESHOLD, MASK_DARK_THRESHOLD)
+
+    def _load_mask(self, mask_image_path, width, height):
+        """
+        处理好的蒙版 (有缓存时优先读缓存，同一蒙版、同一尺寸只缩放与阈值化一次)
+        :return: (缓存键 或 None, 蒙版数组)
+        """
+        if self.mask_cache is None:
+            return None, self._prepare_mask(mask_image_path, width, height)
+        key = self._mask_key(mask_image_path, width, height)
+        return key, self.mask_cache.get(key, lambda: self._prepare_mask(mask_image_path, width, height))
+
+    @staticmethod
+    def _prepare_mask(mask_image_path, width, height):
+        """
+        读取蒙版图片，按比例缩放到目标尺寸内，转为 WordCloud 蒙版 (255白=背景, 0黑=内容)
+        """
+        original_mask = Image.open(mask_image_path).convert("RGBA")
+        orig_w, orig_h = original_mask.size
+
+        # 保持比例缩放
+        ratio = min(width / orig_w, height / orig_h)
+        new_w = int(orig_w * ratio)
+        new_h = int(orig_h * ratio)
+
+        resized_mask = original_mask.resize((new_w, new_h), Image.Resampling.LANCZOS)
+        icon_array = np.array(resized_mask)
+
+        new_mask = np.full((new_h, new_w), 255, dtype=np.uint8)
+
+        # 智能判定：不透明 且 颜色深
+        is_opaque = icon_array[:, :, 3] > MASK_ALPHA_THRESHOLD
+        # 🟢 平均亮度 < 阈值 等价于 三通道之和 < 3 倍阈值，用 uint16 求和，不产生 float64 的大数组
+        brightness_sum = icon_array[:, :, :3].sum(axis=2, dtype=np.uint16)
+        is_dark = brightness_sum < MASK_DARK_THRESHOLD * 3
+
+        target_indices = np.logical_and(is_opaque, is_dark)
+        new_mask[target_indices] = 0
+        return new_mask
+
+    @staticmethod
+    def _to_image(wc, is_transparent, vector_only=False):
+        image = wc.to_preview() if vector_only else wc.to_image()
+        # 放大绘制、分块拼接后的图片必须与请求的目标尺寸 (及全分辨率蒙版) 完全一致
+        if not vector_only and wc.output_shape is not None and image.size != wc.output_shape:
+            raise RuntimeError(f"输出尺寸 {image.size[0]}x{image.size[1]} 与目标 "
+                               f"{wc.output_shape[0]}x{wc.output_shape[1]} 不一致")
 
         # 4. 强制透明化后处理 (仅针对透明模式)
         if is_transparent:
-            image = image.convert("RGBA")
-            datas = image.getdata()
-            new_data = []
-            for item in datas:
-                # 如果像素是纯白(背景)，且我们在透明模式，将其 Alpha 设为 0
-                # WordCloud 有时会在边缘留下白色像素，这里统一清理
-                if item[0] > 250 and item[1] > 250 and item[2] > 250:
-                    new_data.append((255, 255, 255, 0))
-                else:
-                    new_data.append(item)
-            image.putdata(new_data)
+            if image.mode != "RGBA":
+                image = image.convert("RGBA")
+            WordCloudGenerator._clear_white_background(image)
+
+        return image
 
-        return image
\ No newline at end of file
+    @staticmethod
+    def _clear_white_background(image):
+        """
+        把近纯白像素 (RGB 均 > 250) 原地改为透明 (255, 255, 255, 0)
+        WordCloud 有时会在边缘留下白色像素，这里统一清理；其余像素 (含抗锯齿的半透明边缘) 保持不变
+        🟢 整图通道运算在 Pillow 的 C 层完成，不再逐像素遍历 Python 元组
+        """
+        # 按 STRIP_ROWS 行分条处理，中间图的内存与图片高度无关
+        width, height = image.size
+        for top in range(0, height, STRIP_ROWS):
+            box = (0, top, width, min(height, top + STRIP_ROWS))
+            r, g, b, _ = image.crop(box).split()
+            # 三个通道中的最小值 > 250 即三者都 > 250
+            darkest = ImageChops.darker(ImageChops.darker(r, g), b)
+            white_mask = darkest.point(_WHITE_LUT)
+            image.paste((255, 255, 255, 0), box, mask=white_mask)
@@ -0,0 +1,146 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from core.app_paths import cache_dir
+
+# 内存中缓存的数组总大小上限 (可通过 settings.json 的 mask_cache_mb 配置)
+DEFAULT_MEMORY_BYTES = 256 * 1024 * 1024
+# 磁盘缓存总大小上限，超出后删除最久未用的文件
+DEFAULT_DISK_BYTES = 512 * 1024 * 1024
+
+
+class MaskCache:
+    """
+    处理后蒙版的二级缓存 (内存 LRU + 磁盘)
+    缓存的是可直接交给 WordCloud 的数组：缩放并阈值化后的蒙版、按输出尺寸计算好的轮廓层。
+    键由调用方给出 (蒙版路径、修改时间、目标尺寸、阈值参数等)，任一项变化即视为新条目
+    """
+
+    FORMAT_VERSION = 1
+
+    def __init__(self, memory_bytes=DEFAULT_MEMORY_BYTES, directory=None, disk_bytes=DEFAULT_DISK_BYTES):
+        self.directory = directory or cache_dir("masks")
+        os.makedirs(self.directory, exist_ok=True)
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self._memory = OrderedDict()
+        self._memory_used = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def make_key(cls, *parts):
+        data = json.dumps([cls.FORMAT_VERSION, *parts], ensure_ascii=False).encode('utf-8')
+        return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+    def get(self, key, compute):
+        """
+        取缓存的数组，未命中时调用 compute() 计算并写入内存与磁盘
+        :param compute: 无参函数，返回 numpy 数组
+        :return: 只读数组
+        """
+        with self._lock:
+            array = self._memory.pop(key, None)
+            if array is not None:
+                # 最近使用的放在末尾
+                self._memory[key] = array
+                return array
+
+        array = self._load(key)
+        if array is None:
+            array = compute()
+            self._store(key, array)
+        # 数组在多次生成间共享，禁止调用方原地修改
+        array.setflags(write=False)
+
+        with self._lock:
+            self._remember(key, array)
+        return array
+
+    def set_memory_budget(self, memory_bytes):
+        with self._lock:
+            self.memory_bytes = memory_bytes
+            self._shrink()
+
+    def clear_memory(self):
+        with self._lock:
+            self._memory.clear()
+            self._memory_used = 0
+
+    # ---------------------------------------------------------
+    # 内存
+    # ---------------------------------------------------------
+
+    def _remember(self, key, array):
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_used -= old.nbytes
+        if array.nbytes > self.memory_bytes:
+            # 单个数组就超出预算时不常驻内存，只走磁盘缓存
+            return
+        self._memory[key] = array
+        self._memory_used += array.nbytes
+        self._shrink()
+
+    def _shrink(self):
+        while self._memory_used > self.memory_bytes and self._memory:
+            _, array = self._memory.popitem(last=False)
+            self._memory_used -= array.nbytes
+
+    # ---------------------------------------------------------
+    # 磁盘
+    # ---------------------------------------------------------
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.npz")
+
+    def _load(self, key):
+        path = self._path(key)
+        try:
+            with np.load(path) as data:
+                array = data["array"]
+            # 更新访问时间，供淘汰判断
+            os.utime(path)
+            return array
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _store(self, key, array):
+        path = self._path(key)
+        tmp_path = path + ".tmp"
+        try:
+            # 蒙版与轮廓大片相同，压缩后通常只有原大小的百分之几
+            with open(tmp_path, 'wb') as f:
+                np.savez_compressed(f, array=array)
+            os.replace(tmp_path, path)
+            self._evict(keep=path)
+        except OSError as e:
+            print(f"蒙版缓存写入失败: {e}")
+
+    def _evict(self, keep):
+        entries = []
+        total = 0
+        for name in os.listdir(self.directory):
+            if not name.endswith(".npz"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            total += stat.st_size
+            if path != keep:
+                entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.disk_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
@@ -1,7 +1,12 @@
 import jieba
 import jieba.posseg as pseg
 import multiprocessing
-from multiprocessing import Pool, cpu_count
+import os
+import queue
+import threading
+import time
+from collections import Counter, defaultdict
+from multiprocessing import Pool, cpu_count, resource_tracker, shared_memory
 
 # 🟢 智能导入加速库
 try:
@@ -11,116 +16,427 @@ except ImportError:
     pass
 
 
+# 分词引擎标识，用于缓存失效判断
+TOKENIZER_VERSION = f"{jieba.__name__}-{getattr(jieba, '__version__', '')}"
+# jieba 自带主词典的路径
+DEFAULT_DICTIONARY_PATH = os.path.join(os.path.dirname(jieba.__file__), jieba.DEFAULT_DICT_NAME)
+
+# 每个分词任务的目标字符数：任务数远多于进程数，慢块会被其他进程分摊
+DEFAULT_CHUNK_CHARS = 256 * 1024
+# 等待子进程结果时检查是否已被 shutdown() 取消的间隔 (秒)
+_CANCEL_POLL_SECONDS = 0.2
+# 找不到换行时，允许在这些句末标点处切块
+_SENTENCE_ENDS = '。！？；!?;'
+
+
 # ---------------------------------------------------------
 # 必须定义在顶层函数
 # ---------------------------------------------------------
 
-def _init_jieba_worker(custom_dict):
-    """子进程初始化：加载字典"""
-    # 让 jieba 知道这些词
-    if custom_dict:
-        for word in custom_dict:
-            jieba.add_word(word, freq=20000)
+# 当前进程加载的词典路径 (None 表示 jieba 默认词典)
+_loaded_dictionary = None
 
 
-def _worker_task(args):
+def _init_jieba_worker(dictionary_path):
+    """子进程初始化：加载配置方案编译好的词典 (见 core.profile_compiler)"""
+    # 🟢 进程启动时就载入前缀词典，避免第一个任务才触发懒加载；
+    # 只载入本次要用的一份：有编译词典时不再先载入默认词典
+    load_dictionary(dictionary_path)
+    if dictionary_path is None or dictionary_path == DEFAULT_DICTIONARY_PATH:
+        jieba.initialize()
+
+
+def load_dictionary(dictionary_path):
     """
-    子进程执行的具体任务
-    args: (text_chunk, filter_type, stop_words, custom_dict)
+    切换到指定的已编译词典：只有配置方案的 custom_dict 变化时路径才会变化，
+    前缀词典直接从同目录的预构建缓存读取，无需逐词 add_word
+    词性表无需重载：编译时已有词沿用原词性、新词标为 x，与默认词性表的查询结果一致
     """
-    # 🟢 接收 custom_dict
-    text_chunk, filter_type, stop_words, custom_dict = args
+    global _loaded_dictionary
+    if dictionary_path == _loaded_dictionary:
+        return
+    if dictionary_path:
+        jieba.dt.tmp_dir = os.path.dirname(dictionary_path)
+        jieba.dt.initialize(dictionary_path)
+    else:
+        # 回到 jieba 自带词典
+        jieba.dt.tmp_dir = None
+        jieba.dt.initialize(DEFAULT_DICTIONARY_PATH)
+    _loaded_dictionary = dictionary_path
 
-    stop_words_set = set(stop_words)
-    # 🟢 建立 VIP 名单 (转小写以匹配)
-    vip_words_set = set(w.strip().lower() for w in custom_dict) if custom_dict else set()
 
-    valid_words = []
+def dictionary_loaded(dictionary_path):
+    """当前进程是否已载入该词典 (未载入时首次分词需要先花时间加载前缀词典)"""
+    return jieba.dt.initialized and dictionary_path == _loaded_dictionary
 
-    if filter_type == "all":
+
+def iter_tokens(text, seg_mode):
+    """
+    分词并规范化 (去首尾空白、转小写、去空)，按出现顺序产出 (词, 词性)
+    普通分词模式下词性为 ""；进程内分词 (core.tokenizer) 与子进程共用，保证结果一致
+    """
+    if seg_mode == "cut":
         # 全文模式
-        words = jieba.cut(text_chunk, cut_all=False)
-        for w in words:
+        for w in jieba.cut(text, cut_all=False):
             w = w.strip().lower()
+            if w:
+                yield w, ""
+    else:
+        # 智能提取模式：保留词性，供实体筛选使用
+        for word_pair in pseg.cut(text):
+            w = word_pair.word.strip().lower()
+            if w:
+                yield w, word_pair.flag
 
-            # 🟢 VIP 检查：如果是强制保留词，直接通过
-            if w in vip_words_set:
-                valid_words.append(w)
-                continue
 
-            # 普通规则：去空、去停用词、去单字
-            if w and w not in stop_words_set and len(w) > 1:
-                valid_words.append(w)
-    else:
-        # 智能提取模式
-        words = pseg.cut(text_chunk)
+def count_tokens(text, seg_mode):
+    """一块文本的原始词频 Counter {(词, 词性): 次数}"""
+    return Counter(iter_tokens(text, seg_mode))
 
-        for word_pair in words:
-            w = word_pair.word
-            flag = word_pair.flag
-            w = w.strip().lower()
 
-            # 🟢 VIP 检查：强制保留词，无视词性，无视停用词，无视单字限制
-            if w in vip_words_set:
-                valid_words.append(w)
-                continue
+def _read_shared_text(ref):
+    """
+    从共享内存读取一块文本
+    ref: (共享内存名, 字节偏移, 字节长度)，由 ParallelTokenizer.run_parallel 写入的 UTF-8 数据
+    """
+    name, offset, length = ref
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        return bytes(shm.buf[offset:offset + length]).decode('utf-8')
+    finally:
+        shm.close()
+
+
+def _read_file_text(ref):
+    """
+    从文件读取并解码一块文本，只读自己的字节范围
+    ref: (文件路径, 起始字节, 结束字节, 编码)，由 ParallelTokenizer.run_mapped 划分
+    """
+    path, start, end, encoding = ref
+    with open(path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    # 与 FileLoader.read_file 一致：个别坏字节替换为 U+FFFD，换行统一为 \n
+    return data.decode(encoding, errors='replace').replace('\r\n', '\n').replace('\r', '\n')
 
-            # 普通规则过滤
-            if not w or w in stop_words_set or len(w) < 2:
-                continue
 
-            keep = False
-            if filter_type == "name":
-                if flag.startswith('nr'): keep = True
-            elif filter_type == "location":
-                if flag.startswith('ns'): keep = True
-            elif filter_type == "name_location":
-                if flag.startswith('nr') or flag.startswith('ns'): keep = True
-            elif filter_type == "org":
-                if flag.startswith('nt'): keep = True
+def _worker_task(args):
+    """
+    子进程执行的具体任务：只分词计数，不做停用词/实体过滤 (见 core.word_filter)
+    args: (text_chunk, seg_mode, dictionary_path)
+          text_chunk 为字符串，或共享内存中的位置 (见 _read_shared_text)，或文件中的字节范围 (见 _read_file_text)
+    :return: (本块的原始词频 Counter {(词, 词性): 次数}, 本块字符数)
+             在子进程内聚合，只回传词表大小的数据；普通分词模式下词性为 ""
+    """
+    # 🟢 接收配置方案的词典路径，变化时切换词典
+    text_chunk, seg_mode, dictionary_path = args
+    load_dictionary(dictionary_path)
+    if isinstance(text_chunk, tuple):
+        text_chunk = _read_file_text(text_chunk) if len(text_chunk) == 4 else _read_shared_text(text_chunk)
 
-            if keep:
-                valid_words.append(w)
+    return count_tokens(text_chunk, seg_mode), len(text_chunk)
 
-    return valid_words
+
+def _timed_worker_task(args):
+    """包装 _worker_task，附带进程号与耗时，用于统计负载均衡"""
+    start = time.perf_counter()
+    counts, chars = _worker_task(args)
+    return os.getpid(), time.perf_counter() - start, counts, chars, None
+
+
+def _file_worker_task(args):
+    """
+    语料模式的子进程任务：在子进程中读取整个文件并分词计数，父进程只合并词频
+    读取失败的文件返回空词频并附带错误信息，不中断整个语料
+    args: ((文件路径, pdf_text_only), seg_mode, dictionary_path)
+    :return: 同 _timed_worker_task，最后一项为本文件的统计 {"path", "bytes", "chars", "seconds", "error"}
+    """
+    # 只在语料模式用到，避免普通分词进程也载入 PDF/Word 解析库
+    from core.file_loader import FileLoader
+
+    start = time.perf_counter()
+    (path, pdf_text_only), seg_mode, dictionary_path = args
+    load_dictionary(dictionary_path)
+    counts, chars, error = Counter(), 0, None
+    try:
+        for block, _ in FileLoader.iter_blocks(path, pdf_text_only=pdf_text_only):
+            counts.update(count_tokens(block, seg_mode))
+            chars += len(block)
+    except Exception as e:
+        counts, chars, error = Counter(), 0, str(e) or type(e).__name__
+    elapsed = time.perf_counter() - start
+    info = {"path": path, "bytes": os.path.getsize(path) if error is None else 0, "chars": chars,
+            "seconds": elapsed, "error": error}
+    return os.getpid(), elapsed, counts, chars, info
+
+
+def split_chunks(text, chunk_chars=DEFAULT_CHUNK_CHARS):
+    """
+    按字符预算切块：优先在预算附近的换行处切开，超长段落退而在句末标点处切，
+    都找不到时才硬切，保证每块大小相近
+    """
+    for start, end in chunk_bounds(text, chunk_chars):
+        yield text[start:end]
+
+
+def chunk_bounds(text, chunk_chars=DEFAULT_CHUNK_CHARS):
+    """同 split_chunks，但只产出每块的 (起始, 结束) 字符位置，不复制文本"""
+    length = len(text)
+    start = 0
+    while start < length:
+        end = start + chunk_chars
+        if end >= length:
+            yield start, length
+            return
+        # 只在预算的后半段里找切点，避免切出过小的块
+        floor = start + chunk_chars // 2
+        cut = text.rfind('\n', floor, end) + 1
+        if not cut:
+            cut = max(text.rfind(p, floor, end) for p in _SENTENCE_ENDS) + 1
+        if not cut:
+            cut = end
+        yield start, cut
+        start = cut
 
 
 class ParallelTokenizer:
     """
     多进程分词管理器
+    进程池常驻复用：首次使用时懒创建，之后每次生成都复用已预热的子进程，
+    应用退出时调用 shutdown() 关闭 (会中止正在进行的分词，不等它跑完)
+    调度：按字符预算切成远多于进程数的小块，放入无序工作队列，先完成先合并
     """
 
-    @staticmethod
-    def run_parallel(text, filter_type, custom_dict, stop_words):
-        # 1. 准备数据
-        lines = text.split('\n')
+    def __init__(self, processes=None, chunk_chars=DEFAULT_CHUNK_CHARS):
+        self.processes = processes or max(1, cpu_count())
+        # 目标块大小 (字符数)，可通过 settings.json 的 chunk_chars 配置
+        self.chunk_chars = chunk_chars
+        # 最近一次分词的调度统计：块数、参与进程数、负载均衡率
+        self.last_stats = {}
+        self._pool = None
+        # 子进程最近一次使用的词典
+        self._dictionary_path = None
+        # _lock 在整次分词期间持有；_pool_lock 只保护进程池的创建与替换，
+        # 这样 shutdown() 不必等正在进行的分词结束
+        self._lock = threading.Lock()
+        self._pool_lock = threading.Lock()
+        self._closed = threading.Event()
+
+    def is_ready(self, dictionary_path=None):
+        """进程池是否已启动并使用该词典 (此时并行分词没有启动开销)"""
+        return self._pool is not None and self._dictionary_path == dictionary_path
+
+    def _get_pool(self, dictionary_path):
+        with self._pool_lock:
+            if self._closed.is_set():
+                raise RuntimeError("分词已取消：进程池已关闭")
+            if self._pool is None:
+                if os.name == 'posix':
+                    # 先启动共享内存的资源跟踪进程，子进程继承后与父进程共用同一个，
+                    # 否则每个子进程挂载共享内存时会各自再起一个
+                    resource_tracker.ensure_running()
+                self._pool = Pool(processes=self.processes, initializer=_init_jieba_worker,
+                                  initargs=(dictionary_path,))
+                self._dictionary_path = dictionary_path
+            return self._pool
+
+    def warm_up(self, dictionary_path=None):
+        """提前启动进程池 (子进程在后台加载词典，不阻塞调用方)"""
+        # 正在分词时进程池必然已存在，直接跳过，避免卡住界面线程
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            self._get_pool(dictionary_path)
+        finally:
+            self._lock.release()
+
+    def run_parallel(self, text, seg_mode, dictionary_path=None, on_progress=None):
+        """
+        并行分词并统计原始词频 (过滤见 core.word_filter.filter_counts)
+        :param seg_mode: "cut" / "pos"，见 core.word_filter.segment_mode
+        :param dictionary_path: 配置方案编译好的词典 (CompiledProfile.dictionary_path)，None 为默认词典
+        :param on_progress: 每完成一块回调一次，参数为进度字典
+                            {"done": 已完成块数, "total": 总块数, "consumed": 已处理字符数, "chars": 同前}
+        :return: 全文原始词频 Counter {(词, 词性): 次数}
+        """
+        # 🟢 全文只写入一次共享内存，任务只携带 (名称, 偏移, 长度)，不再逐块序列化文本
+        shm, refs = self._share_text(text)
+        if shm is None:
+            refs = [(text[start:end], end, end - start) for start, end in chunk_bounds(text, self.chunk_chars)]
+        try:
+            results, _ = self._run_chunks(refs, seg_mode, dictionary_path, on_progress, total=len(refs))
+        finally:
+            # 无论成功、出错还是被中断，都释放共享内存
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+        return results
+
+    def _share_text(self, text):
+        """
+        把文本按块编码为 UTF-8 写入一段共享内存
+        :return: (SharedMemory, [(块位置, 字符位置, 字符数), ...])；共享内存不可用时返回 (None, None)
+        """
+        bounds = list(chunk_bounds(text, self.chunk_chars))
+        # 先只算各块编码后的字节数，写入时再逐块编码，同一时刻只存在一块的编码副本
+        sizes = [len(text[start:end].encode('utf-8')) for start, end in bounds]
+        try:
+            shm = shared_memory.SharedMemory(create=True, size=max(1, sum(sizes)))
+        except OSError as e:
+            print(f"共享内存不可用，改为逐块传输文本: {e}")
+            return None, None
+
+        refs = []
+        offset = 0
+        try:
+            for (start, end), size in zip(bounds, sizes):
+                shm.buf[offset:offset + size] = text[start:end].encode('utf-8')
+                refs.append(((shm.name, offset, size), end, end - start))
+                offset += size
+        except BaseException:
+            shm.close()
+            shm.unlink()
+            raise
+        return shm, refs
+
+    def run_stream(self, blocks, seg_mode, dictionary_path=None, on_progress=None, max_in_flight=None):
+        """
+        流式并行分词：边读边分，同一时刻最多只有 max_in_flight 个文本块在途，
+        父进程只保留合并后的词频表，峰值内存与输入大小无关
+        :param blocks: 可迭代对象，产出 (文本块, 已消耗字节数)，例如 FileLoader.iter_blocks
+        :param on_progress: 同 run_parallel，其中 total 为 None，consumed 为已完成的字节位置
+        :return: (全文原始词频 Counter, 总字符数)
+        """
+        return self._run_chunks(self._rechunk(blocks), seg_mode, dictionary_path,
+                                on_progress, max_in_flight=max_in_flight)
+
+    def run_mapped(self, path, encoding, ranges, seg_mode, dictionary_path=None, on_progress=None):
+        """
+        按字节范围并行分词 (范围由 FileLoader.map_text_ranges 划分)：任务只携带 (路径, 起止字节, 编码)，
+        子进程自己读取、解码，父进程既不读入也不解码文本
+        :param on_progress: 同 run_parallel，其中 consumed 为已完成的字节位置
+        :return: (全文原始词频 Counter, 总字符数)
+        """
+        chunks = (((path, start, end, encoding), end, end - start) for start, end in ranges)
+        return self._run_chunks(chunks, seg_mode, dictionary_path, on_progress, total=len(ranges))
+
+    def run_files(self, paths, seg_mode, dictionary_path=None, on_progress=None, pdf_text_only=False):
+        """
+        语料模式：每个文件一个任务，读取与分词都在子进程中进行，先完成的文件先合并
+        :param paths: 文件列表 (见 FileLoader.collect_files)
+        :param on_progress: 同 run_parallel，total 为文件数，另有 "file" 为刚完成文件的统计 (见 _file_worker_task)
+        :return: (全部文件的原始词频 Counter, 总字符数)
+        """
+        # 🟢 大文件先提交，避免最后只剩一个大文件在跑、其余进程空等
+        ordered = sorted(paths, key=os.path.getsize, reverse=True)
+        chunks = (((path, pdf_text_only), 0, 0) for path in ordered)
+        return self._run_chunks(chunks, seg_mode, dictionary_path, on_progress,
+                                total=len(ordered), task=_file_worker_task)
+
+    def _rechunk(self, blocks):
+        """把读取到的文本块整理成接近 chunk_chars 的任务块：小块合并，大块切开"""
+        buffer, buffered = [], 0
+        consumed = 0
+        for block, consumed in blocks:
+            buffer.append(block)
+            buffered += len(block)
+            if buffered < self.chunk_chars:
+                continue
+            text = "".join(buffer)
+            pieces = list(split_chunks(text, self.chunk_chars))
+            # 最后一片可能不足预算，留到下一轮与后续文本合并
+            tail = pieces.pop()
+            for piece in pieces:
+                yield piece, consumed, len(piece)
+            buffer, buffered = [tail], len(tail)
+        if buffered:
+            text = "".join(buffer)
+            yield text, consumed, len(text)
+
+    def _run_chunks(self, chunks, seg_mode, dictionary_path,
+                    on_progress=None, total=None, max_in_flight=None, task=_timed_worker_task):
+        """
+        无序工作队列：限制在途任务数，任一块完成即合并并回调进度，慢块不会阻塞其他块
+        :param chunks: 产出 (文本块, 位置, 大小) 的可迭代对象，文本块可以是共享内存中的位置或文件中的字节范围
+        :param task: 子进程任务 (_timed_worker_task / _file_worker_task)
+        :return: (词频表 Counter, 总字符数 (子进程解码后的实际字符数))
+        """
+        if max_in_flight is None:
+            max_in_flight = self.processes * 2
 
-        # 2. 确定并行数量
-        num_cores = max(1, cpu_count())
+        results = Counter()
+        busy_by_worker = defaultdict(float)
+        done_queue = queue.Queue()
+        state = {"in_flight": 0, "done": 0, "chars": 0, "consumed": 0}
 
-        # 3. 智能分块
-        chunk_size = len(lines) // num_cores + 1
-        chunks = []
-        current_chunk = []
+        def collect_one():
+            # 🟢 分段等待：shutdown() 终止进程池后不会再有结果回来，据此中止本次分词
+            while True:
+                try:
+                    ok, payload, position = done_queue.get(timeout=_CANCEL_POLL_SECONDS)
+                    break
+                except queue.Empty:
+                    if self._closed.is_set():
+                        raise RuntimeError("分词已取消：进程池已关闭")
+            state["in_flight"] -= 1
+            if not ok:
+                raise payload
+            pid, elapsed, counts, chunk_chars, file_info = payload
+            results.update(counts)
+            busy_by_worker[pid] += elapsed
+            state["done"] += 1
+            state["chars"] += chunk_chars
+            state["consumed"] = max(state["consumed"], position)
+            if on_progress:
+                progress = {"done": state["done"], "total": total,
+                            "consumed": state["consumed"], "chars": state["chars"]}
+                if file_info is not None:
+                    progress["file"] = file_info
+                on_progress(progress)
 
-        for line in lines:
-            current_chunk.append(line)
-            if len(current_chunk) >= chunk_size:
-                chunks.append("\n".join(current_chunk))
-                current_chunk = []
-        if current_chunk:
-            chunks.append("\n".join(current_chunk))
+        with self._lock:
+            pool = self._get_pool(dictionary_path)
+            try:
+                for chunk, position, _ in chunks:
+                    pool.apply_async(
+                        task, ((chunk, seg_mode, dictionary_path),),
+                        callback=lambda r, p=position: done_queue.put((True, r, p)),
+                        error_callback=lambda e, p=position: done_queue.put((False, e, p)))
+                    state["in_flight"] += 1
+                    # 🟢 背压：在途任务已满时先等任意一个任务完成
+                    while state["in_flight"] >= max_in_flight:
+                        collect_one()
+                while state["in_flight"]:
+                    collect_one()
+                self._dictionary_path = dictionary_path
+            except Exception as e:
+                # 进程池可能已损坏或仍有残留任务，丢弃后下次重建
+                self._terminate_pool()
+                if self._closed.is_set():
+                    # 提交任务时进程池已被 shutdown() 终止 (apply_async 报 "Pool not running")
+                    raise RuntimeError("分词已取消：进程池已关闭") from e
+                raise
 
-        # 4. 准备任务参数
-        # 🟢 关键修改：把 custom_dict 也传给每个任务，用于做 VIP 校验
-        tasks = [(chunk, filter_type, stop_words, custom_dict) for chunk in chunks]
+        self.last_stats = self._balance_stats(state["done"], busy_by_worker)
+        return results, state["chars"]
 
-        # 5. 启动多进程
-        results = []
-        with Pool(processes=num_cores, initializer=_init_jieba_worker, initargs=(custom_dict,)) as pool:
-            raw_results = pool.map(_worker_task, tasks)
+    def _balance_stats(self, chunk_count, busy_by_worker):
+        """负载均衡率 = 各进程总忙碌时间 / (进程数 × 最忙进程的时间)，100% 表示完全均衡"""
+        busiest = max(busy_by_worker.values(), default=0.0)
+        balance = sum(busy_by_worker.values()) / (self.processes * busiest) if busiest else 1.0
+        return {"chunks": chunk_count, "workers": len(busy_by_worker), "balance": balance}
 
-            for sub_list in raw_results:
-                results.extend(sub_list)
+    def shutdown(self):
+        """
+        关闭常驻进程池，之后不再接受新的分词
+        不等待正在进行的分词：直接终止子进程，分词线程随后抛出 RuntimeError 退出
+        """
+        self._closed.set()
+        self._terminate_pool()
 
-        return results
\ No newline at end of file
+    def _terminate_pool(self):
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.terminate()
+            pool.join()
@@ -0,0 +1,152 @@
+import json
+import os
+import time
+from multiprocessing import Pool, cpu_count
+
+import jieba
+
+# 🟢 与分词进程保持一致：优先使用加速库
+try:
+    import jieba_fast as jieba
+except ImportError:
+    pass
+
+from core.app_paths import cache_dir
+from core.parallel_processor import (DEFAULT_DICTIONARY_PATH, TOKENIZER_VERSION, _init_jieba_worker,
+                                     count_tokens, load_dictionary)
+from core.tokenizer import Tokenizer
+
+SERIAL = "serial"
+THREAD = "thread"
+PROCESS = "process"
+
+# 校准文件格式版本，测量方式变化时递增
+CALIBRATION_VERSION = 1
+# 校准时截取的样本长度 (字符)；样本过短测不准，直接跳过校准
+SAMPLE_CHARS = 32 * 1024
+MIN_SAMPLE_CHARS = 2 * 1024
+# 多进程的并行效率 (切块、回传与合并的损耗)
+PARALLEL_EFFICIENCY = 0.85
+# 每个分词块在进程间调度与回传词表的固定开销 (秒)
+PROCESS_TASK_OVERHEAD = 0.005
+
+
+class ExecutionPlanner:
+    """
+    分词执行计划：按输入大小、分词方式和本机校准数据，在串行、多线程、多进程之间选最快的一种
+    校准只在首次使用时做一次 (测量两种分词方式的速度、词典加载与进程池启动耗时)，结果存盘复用，
+    分词引擎或 CPU 核数变化时重新校准
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(cache_dir("planner"), "calibration.json")
+        self.calibration = self._load()
+
+    def needs_calibration(self):
+        return self.calibration is None
+
+    def calibrate(self, sample_text, dictionary_path=None):
+        """
+        用实际输入的开头一段测量本机速度
+        :return: 是否完成校准 (样本太短时跳过，下次再测)
+        """
+        sample = sample_text[:SAMPLE_CHARS]
+        if len(sample) < MIN_SAMPLE_CHARS:
+            return False
+
+        # 在独立的分词器实例上加载词典，测量冷启动加载耗时 (前缀词典已缓存时即读缓存的耗时)
+        start = time.perf_counter()
+        loader = jieba.Tokenizer(dictionary_path or DEFAULT_DICTIONARY_PATH)
+        loader.tmp_dir = os.path.dirname(dictionary_path) if dictionary_path else None
+        loader.initialize()
+        dictionary_load = time.perf_counter() - start
+        del loader
+
+        # 当前进程也载入词典，保证下面只测分词本身
+        load_dictionary(dictionary_path)
+        count_tokens("预热", "pos")
+
+        rates = {}
+        for seg_mode in ("cut", "pos"):
+            start = time.perf_counter()
+            count_tokens(sample, seg_mode)
+            rates[seg_mode] = len(sample) / max(time.perf_counter() - start, 1e-6)
+
+        # 多线程的实际加速比 (受 GIL 限制，通常接近 1)
+        threads = min(4, cpu_count())
+        thread_speedup = 1.0
+        if threads > 1:
+            tokenizer = Tokenizer(chunk_chars=max(1, len(sample) // threads))
+            start = time.perf_counter()
+            tokenizer.count(sample, "cut", dictionary_path, threads=threads)
+            threaded = time.perf_counter() - start
+            thread_speedup = (len(sample) / rates["cut"]) / max(threaded, 1e-6)
+
+        # 进程池冷启动：创建进程并在子进程内加载词典
+        pool_startup = 0.0
+        if cpu_count() > 1:
+            start = time.perf_counter()
+            pool = Pool(processes=1, initializer=_init_jieba_worker, initargs=(dictionary_path,))
+            try:
+                pool.apply(os.getpid)
+                pool_startup = time.perf_counter() - start
+            finally:
+                pool.terminate()
+                pool.join()
+
+        self.calibration = {
+            "version": CALIBRATION_VERSION,
+            "engine": TOKENIZER_VERSION,
+            "cpus": cpu_count(),
+            "rates": rates,
+            "thread_speedup": thread_speedup,
+            "dictionary_load": dictionary_load,
+            "pool_startup": pool_startup,
+        }
+        self._save()
+        return True
+
+    def plan(self, char_count, seg_mode, processes, chunk_chars, pool_ready, dictionary_ready):
+        """
+        选择执行方式
+        :param pool_ready: 进程池已启动且已加载所需词典 (见 ParallelTokenizer.is_ready)
+        :param dictionary_ready: 当前进程已加载所需词典 (见 parallel_processor.dictionary_loaded)
+        :return: (SERIAL / THREAD / PROCESS, {方式: 预计耗时秒数})；未校准时沿用多进程
+        """
+        if self.calibration is None:
+            return PROCESS, {}
+
+        c = self.calibration
+        work = char_count / c["rates"][seg_mode]
+        load = 0.0 if dictionary_ready else c["dictionary_load"]
+
+        estimates = {SERIAL: load + work}
+        if c["thread_speedup"] > 1.0:
+            estimates[THREAD] = load + work / c["thread_speedup"]
+        if processes > 1:
+            chunks = max(1, -(-char_count // chunk_chars))
+            startup = 0.0 if pool_ready else c["pool_startup"]
+            estimates[PROCESS] = (startup + work / (min(processes, chunks) * PARALLEL_EFFICIENCY)
+                                  + chunks * PROCESS_TASK_OVERHEAD / processes)
+        return min(estimates, key=estimates.get), estimates
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                calibration = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if (calibration.get("version") != CALIBRATION_VERSION
+                or calibration.get("engine") != TOKENIZER_VERSION
+                or calibration.get("cpus") != cpu_count()):
+            return None
+        return calibration
+
+    def _save(self):
+        try:
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.calibration, f, indent=4)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"分词校准结果保存失败: {e}")
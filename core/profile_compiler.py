@@ -0,0 +1,172 @@
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import threading
+
+import jieba
+
+# 🟢 与分词进程保持一致：优先使用加速库
+try:
+    import jieba_fast as jieba
+except ImportError:
+    pass
+
+from core.app_paths import cache_dir
+from core.parallel_processor import DEFAULT_DICTIONARY_PATH, TOKENIZER_VERSION
+from core.word_filter import build_filter_sets
+
+# 自定义词注入的词频 (与 jieba.add_word(word, freq=20000) 一致)
+CUSTOM_WORD_FREQ = 20000
+# 词典与过滤集合各最多保留多少份，超出后删除最久未用的
+MAX_ARTIFACTS = 8
+# 内存中缓存的已编译配置方案数量
+MAX_MEMO = 4
+
+
+class CompiledProfile:
+    """
+    编译好的配置方案
+    dictionary_path: 已合并自定义词的 jieba 词典 (同目录下附带预构建的前缀词典缓存)
+    stop_words / vip_words: 冻结后的停用词与强制保留词集合，供过滤阶段直接使用
+    """
+
+    def __init__(self, key, dictionary_path, stop_words, vip_words):
+        self.key = key
+        self.dictionary_path = dictionary_path
+        self.stop_words = stop_words
+        self.vip_words = vip_words
+
+
+class ProfileCompiler:
+    """
+    配置方案编译器
+    每个方案只编译一次：自定义词典合并进 jieba 主词典并预构建前缀词典缓存，
+    分词进程通过进程池初始化函数直接加载，不再逐词调用 jieba.add_word；
+    停用词/强制保留词冻结为集合并落盘。方案文本不变时始终复用已有产物
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory or cache_dir("profiles")
+        os.makedirs(self.directory, exist_ok=True)
+        self._memo = {}
+        self._lock = threading.Lock()
+
+    def compile(self, custom_dict, stop_words):
+        custom_dict = sorted(set(custom_dict or []))
+        stop_words = sorted(set(stop_words or []))
+        key = self._hash([custom_dict, stop_words])
+
+        with self._lock:
+            profile = self._memo.pop(key, None)
+            if profile is None:
+                dictionary_path = self._compile_dictionary(custom_dict)
+                stop_set, vip_set = self._compile_filter_sets(key, custom_dict, stop_words)
+                profile = CompiledProfile(key, dictionary_path, stop_set, vip_set)
+            # 最近使用的放在末尾
+            self._memo[key] = profile
+            while len(self._memo) > MAX_MEMO:
+                self._memo.pop(next(iter(self._memo)))
+            return profile
+
+    def find_dictionary(self, custom_dict):
+        """已编译过的词典路径，尚未编译时返回 None (不触发编译，可在界面线程调用)"""
+        dict_dir = self._dictionary_dir(sorted(set(custom_dict or [])))
+        dictionary_path = os.path.join(dict_dir, "dict.txt")
+        return dictionary_path if self._dictionary_ready(dictionary_path) else None
+
+    # ---------------------------------------------------------
+    # 词典
+    # ---------------------------------------------------------
+
+    def _dictionary_dir(self, custom_dict):
+        return os.path.join(self.directory, "dict-" + self._hash([custom_dict, TOKENIZER_VERSION]))
+
+    @staticmethod
+    def _dictionary_ready(dictionary_path):
+        return os.path.exists(os.path.join(os.path.dirname(dictionary_path), "ready"))
+
+    def _compile_dictionary(self, custom_dict):
+        dict_dir = self._dictionary_dir(custom_dict)
+        dictionary_path = os.path.join(dict_dir, "dict.txt")
+        if self._dictionary_ready(dictionary_path):
+            # 更新访问时间，供淘汰判断
+            os.utime(dict_dir)
+            return dictionary_path
+
+        shutil.rmtree(dict_dir, ignore_errors=True)
+        os.makedirs(dict_dir)
+        # 主词典原样保留，自定义词追加在末尾：jieba 加载时后出现的词频覆盖前者、
+        # 总词频累加，与逐个 add_word 的效果完全相同
+        tags = {}
+        with open(DEFAULT_DICTIONARY_PATH, 'rb') as src, open(dictionary_path, 'wb') as dst:
+            for line in src:
+                dst.write(line)
+                parts = line.strip().decode('utf-8').split(' ')
+                if len(parts) == 3:
+                    tags[parts[0]] = parts[2]
+            if not line.endswith(b'\n'):
+                dst.write(b'\n')
+            for word in custom_dict:
+                # 词典文件以空格分列，含空白的词无法写入 (jieba 也不会切出这样的词)
+                if not word or any(ch.isspace() for ch in word):
+                    continue
+                # 已有词沿用原词性；新词标为 x，与 add_word 后词性标注的结果一致
+                tag = tags.get(word, 'x')
+                dst.write(f"{word} {CUSTOM_WORD_FREQ} {tag}\n".encode('utf-8'))
+
+        # 预构建前缀词典缓存 (marshal)，分词进程加载时直接读取
+        builder = jieba.Tokenizer(dictionary_path)
+        builder.tmp_dir = dict_dir
+        builder.initialize()
+
+        open(os.path.join(dict_dir, "ready"), 'w').close()
+        self._evict("dict-", keep=dict_dir)
+        return dictionary_path
+
+    def _evict(self, prefix, keep):
+        """同类产物最多保留 MAX_ARTIFACTS 份，删除最久未用的"""
+        paths = [os.path.join(self.directory, name) for name in os.listdir(self.directory)
+                 if name.startswith(prefix)]
+        paths = [p for p in paths if p != keep]
+        paths.sort(key=os.path.getmtime)
+        while len(paths) >= MAX_ARTIFACTS:
+            path = paths.pop(0)
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    # ---------------------------------------------------------
+    # 过滤集合
+    # ---------------------------------------------------------
+
+    def _compile_filter_sets(self, key, custom_dict, stop_words):
+        sets_path = os.path.join(self.directory, f"sets-{key}.pickle")
+        try:
+            with open(sets_path, 'rb') as f:
+                filter_sets = pickle.load(f)
+            os.utime(sets_path)
+            return filter_sets
+        except (OSError, pickle.UnpicklingError, EOFError):
+            pass
+
+        filter_sets = build_filter_sets(stop_words, custom_dict)
+        try:
+            tmp_path = sets_path + ".tmp"
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(filter_sets, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, sets_path)
+            self._evict("sets-", keep=sets_path)
+        except OSError as e:
+            print(f"配置方案缓存写入失败: {e}")
+        return filter_sets
+
+    @staticmethod
+    def _hash(payload):
+        data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        return hashlib.blake2b(data, digest_size=16).hexdigest()
@@ -0,0 +1,128 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from PIL import Image, ImageDraw
+
+from core.font_cache import FONT_CACHE
+
+# 分块边长 (像素)：8K 画布约 8x5 块，每块的中间缓冲区只有几 MB
+DEFAULT_TILE_SIZE = 1024
+# 计算词的外框时向外多留的像素，保证判断与分块相交时不漏掉抗锯齿边缘
+_BBOX_PADDING = 1
+
+
+def rasterize(mode, size, background_color, font_path, items, origin=(0, 0), font_owner=None):
+    """
+    串行绘制 (与 WordCloud.to_image 的绘制方式相同)
+    :param items: 绘制列表 [(词, 字号, 方向, (x, y), 颜色)]，按顺序绘制，后画的覆盖先画的
+    :param origin: 画布左上角在整图中的坐标，分块绘制时使用
+    :param font_owner: 字体对象的持有者 (见 FontCache)，并行绘制时每个线程各用一份
+    """
+    img = Image.new(mode, size, background_color)
+    draw = ImageDraw.Draw(img)
+    ox, oy = origin
+    for word, font_size, orientation, (x, y), color in items:
+        font = FONT_CACHE.transposed(font_path, font_size, orientation, font_owner)
+        draw.text((x - ox, y - oy), word, fill=color, font=font)
+    return img
+
+
+def bucket_items(mode, size, font_path, items, tile_width, tile_height, origin=(0, 0)):
+    """
+    按外框把词分配到与之相交的分块，保持原有绘制顺序
+    :param origin: 画布左上角在整图中的坐标 (items 的坐标为整图坐标)
+    :return: {(列, 行): [item, ...]}
+    """
+    width, height = size
+    ox, oy = origin
+    columns = -(-width // tile_width)
+    rows = -(-height // tile_height)
+    buckets = {}
+    measure = ImageDraw.Draw(Image.new(mode, (1, 1)))
+    for item in items:
+        word, font_size, orientation, (x, y), _ = item
+        font = FONT_CACHE.transposed(font_path, font_size, orientation)
+        left, top, right, bottom = measure.textbbox((x - ox, y - oy), word, font=font)
+        left, top = max(0, left - _BBOX_PADDING), max(0, top - _BBOX_PADDING)
+        right, bottom = min(width, right + _BBOX_PADDING), min(height, bottom + _BBOX_PADDING)
+        for row in range(top // tile_height, min(rows, -(-bottom // tile_height))):
+            for column in range(left // tile_width, min(columns, -(-right // tile_width))):
+                buckets.setdefault((column, row), []).append(item)
+    return buckets
+
+
+def _render_tile(args):
+    """绘制一个分块 (子线程或子进程中执行)"""
+    mode, box, background_color, font_path, items, (ox, oy) = args
+    left, top, right, bottom = box
+    return box, rasterize(mode, (right - left, bottom - top), background_color, font_path, items,
+                          (ox + left, oy + top), font_owner=threading.get_ident())
+
+
+def _render_tile_bytes(args):
+    """子进程版本：图片以原始字节回传"""
+    box, tile = _render_tile(args)
+    return box, tile.tobytes()
+
+
+class TileRasterizer:
+    """
+    分块并行绘制
+    把画布切成 tile_size 见方的分块，每块只绘制与它相交的词 (顺序不变)，各块并行绘制后拼回整图。
+    词的位置均为整数像素，平移到分块坐标后字形栅格化结果不变，因此与串行绘制逐像素一致；
+    中间缓冲区只与分块大小有关
+    """
+
+    def __init__(self, tile_size=DEFAULT_TILE_SIZE, workers=None, use_processes=True):
+        self.tile_size = tile_size
+        self.workers = workers or os.cpu_count() or 1
+        # 默认用进程：Pillow 的 Font.render 栅格化字形时不释放 GIL，线程模式几乎无法并行，
+        # 加上跨分块的词要在每个分块里重复绘制，反而比串行更慢 (见 benchmarks/bench_rasterizer.py)
+        self.use_processes = use_processes
+        # 线程/进程常驻复用：进程/线程不变，各自缓存的字体对象在多次生成之间也能复用
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def render(self, mode, size, background_color, font_path, items, origin=(0, 0)):
+        """
+        :param origin: 画布左上角在整图中的坐标，只绘制整图中的一条/一块时使用
+        """
+        width, height = size
+        tile = self.tile_size
+        columns = -(-width // tile)
+        rows = -(-height // tile)
+        if self.workers <= 1 or columns * rows <= 1:
+            return rasterize(mode, size, background_color, font_path, items, origin)
+
+        tiles = bucket_items(mode, size, font_path, items, tile, tile, origin)
+        canvas = Image.new(mode, size, background_color)
+        tasks = []
+        for (column, row), tile_items in tiles.items():
+            box = (column * tile, row * tile, min(width, (column + 1) * tile), min(height, (row + 1) * tile))
+            tasks.append((mode, box, background_color, font_path, tile_items, origin))
+
+        with self._lock:
+            executor = self._get_executor()
+            if self.use_processes:
+                for (left, top, right, bottom), data in executor.map(_render_tile_bytes, tasks):
+                    canvas.paste(Image.frombytes(mode, (right - left, bottom - top), data), (left, top))
+            else:
+                for (left, top, _, _), image in executor.map(_render_tile, tasks):
+                    canvas.paste(image, (left, top))
+        return canvas
+
+    def _get_executor(self):
+        if self._executor is None:
+            if self.use_processes:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="tile")
+        return self._executor
+
+    def shutdown(self):
+        """关闭常驻的线程/进程"""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
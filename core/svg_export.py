@@ -0,0 +1,96 @@
+import base64
+import io
+from xml.sax.saxutils import escape, quoteattr
+
+from PIL import Image, ImageFont
+
+from core.font_cache import FONT_CACHE
+
+# 坐标保留的小数位数 (词的位置本身是整数像素，只有字体度量会带小数)
+_PRECISION = 2
+
+
+def _number(value):
+    return f"{round(value, _PRECISION):g}"
+
+
+def font_face(font_path):
+    """
+    字体族名与 CSS 字重/字形
+    :return: (family, weight, style)
+    """
+    family, style = ImageFont.truetype(font_path, 12).getname()
+    style = (style or "").lower()
+    weight = "bold" if "bold" in style else "normal"
+    if "italic" in style:
+        font_style = "italic"
+    elif "oblique" in style:
+        font_style = "oblique"
+    else:
+        font_style = "normal"
+    return family or "sans-serif", weight, font_style
+
+
+def subset_font(font_path, text):
+    """
+    截取字体中 text 用到的字形，输出 WOFF 字节
+    msyh.ttc 这类字体集合取第一个字体 (与 ImageFont.truetype 的默认值一致)
+    """
+    # fonttools 只在嵌入字体时才用到，用时再导入
+    from fontTools import subset
+    from fontTools.ttLib import TTFont
+
+    options = subset.Options()
+    # 去掉 hinting 与子程序，子集体积可再小一半，对字形几乎没有影响
+    options.hinting = False
+    options.desubroutinize = True
+    options.ignore_missing_glyphs = True
+    font = TTFont(font_path, fontNumber=0, lazy=True)
+    subsetter = subset.Subsetter(options)
+    subsetter.populate(text=text)
+    subsetter.subset(font)
+    # 🟢 直接以 WOFF 保存 (zlib 压缩)，不经过 XML 中转
+    font.flavor = "woff"
+    buffer = io.BytesIO()
+    font.save(buffer)
+    font.close()
+    return buffer.getvalue()
+
+
+def write_svg(fp, size, background_color, font_path, items, embed_font=False):
+    """
+    把绘制列表直接写成 SVG，不经过位图
+    文字的位置按 Pillow 的绘制方式换算 (词的墨迹外框左上角落在 (x, y))，与 PNG 输出对齐
+    :param fp: 文本方式打开的文件对象
+    :param items: 绘制列表 [(词, 字号, 方向, (x, y), 颜色)]，同 core.rasterizer.rasterize
+    :param embed_font: 是否嵌入只含已用字形的字体子集 (WOFF)，看图的机器没有该字体时也能正确显示
+    """
+    width, height = size
+    family, weight, style = font_face(font_path)
+
+    fp.write(f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+             f'viewBox="0 0 {width} {height}">\n')
+    fp.write("<style>")
+    if embed_font:
+        characters = "".join(sorted({c for item in items for c in item[0]}))
+        data = base64.b64encode(subset_font(font_path, characters)).decode("ascii")
+        fp.write(f"@font-face{{font-family:{quoteattr(family)};font-weight:{weight};font-style:{style};"
+                 f'src:url("data:font/woff;base64,{data}") format("woff");}}')
+    fp.write(f"text{{font-family:{quoteattr(family)};font-weight:{weight};font-style:{style};}}")
+    fp.write("</style>\n")
+
+    if background_color is not None:
+        fp.write(f'<rect width="100%" height="100%" fill={quoteattr(str(background_color))}/>\n')
+
+    for word, font_size, orientation, (x, y), color in items:
+        font = FONT_CACHE.truetype(font_path, font_size)
+        ascent = font.getmetrics()[0]
+        left, top, right, _ = font.getbbox(word)
+        if orientation == Image.Transpose.ROTATE_90:
+            # 横排字形逆时针旋转 90 度，旋转后墨迹外框的左上角对齐 (x, y)
+            transform = f"translate({_number(x - top + ascent)},{_number(y + right)}) rotate(-90)"
+        else:
+            transform = f"translate({_number(x - left)},{_number(y - top + ascent)})"
+        fp.write(f'<text transform="{transform}" font-size="{font_size}" fill={quoteattr(str(color))}>'
+                 f"{escape(word)}</text>\n")
+    fp.write("</svg>\n")
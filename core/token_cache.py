@@ -0,0 +1,164 @@
+import hashlib
+import json
+import marshal
+import os
+import threading
+import time
+import zlib
+from collections import Counter
+
+from core.app_paths import cache_dir
+
+# 缓存总大小上限，超出后按最近使用时间淘汰
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+# 计算文件内容哈希时每次读取的字节数
+HASH_BLOCK_BYTES = 8 * 1024 * 1024
+# 最多记住多少个文件的 (大小, 修改时间) -> 内容哈希
+MAX_DIGEST_MEMO = 1000
+
+
+class TokenCache:
+    """
+    分词结果磁盘缓存 (内容寻址)
+    键 = 文件内容哈希 + 分词方式 + 自定义词典 + 分词引擎版本，
+    值 = 压缩后的原始词频 {(词, 词性): 次数}。停用词与实体筛选在读取缓存后再做，
+    因此只改蒙版、背景色、分辨率或停用词时都可直接跳过读取与分词
+    """
+
+    FORMAT_VERSION = 2
+
+    def __init__(self, directory=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory or cache_dir("tokens")
+        os.makedirs(self.directory, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._index_path = os.path.join(self.directory, "index.json")
+        self._lock = threading.Lock()
+        self._index = self._load_index()
+
+    # ---------------------------------------------------------
+    # 键
+    # ---------------------------------------------------------
+
+    def file_digest(self, path):
+        """
+        文件内容哈希；大小与修改时间未变时直接复用上次的结果，
+        已分析过的大文件无需重新读一遍
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        memo = self._index["digests"].get(path)
+        if memo and memo[0] == stat.st_size and memo[1] == stat.st_mtime_ns:
+            return memo[2]
+
+        hasher = hashlib.blake2b(digest_size=20)
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(HASH_BLOCK_BYTES), b''):
+                hasher.update(block)
+        digest = hasher.hexdigest()
+
+        with self._lock:
+            digests = self._index["digests"]
+            digests.pop(path, None)
+            digests[path] = [stat.st_size, stat.st_mtime_ns, digest]
+            while len(digests) > MAX_DIGEST_MEMO:
+                digests.pop(next(iter(digests)))
+            self._save_index()
+        return digest
+
+    def make_key(self, path, seg_mode, custom_dict, engine_version):
+        payload = json.dumps([
+            self.FORMAT_VERSION,
+            self.file_digest(path),
+            seg_mode,
+            sorted(set(custom_dict or [])),
+            engine_version,
+        ], ensure_ascii=False)
+        return hashlib.blake2b(payload.encode('utf-8'), digest_size=20).hexdigest()
+
+    # ---------------------------------------------------------
+    # 读写
+    # ---------------------------------------------------------
+
+    def get(self, key):
+        """
+        :return: (词频表 Counter, 元数据 dict)，未命中返回 None
+        """
+        entry_path = self._entry_path(key)
+        with self._lock:
+            entry = self._index["entries"].get(key)
+            if entry is None or not os.path.exists(entry_path):
+                return None
+            entry["atime"] = time.time()
+            self._save_index()
+
+        try:
+            with open(entry_path, 'rb') as f:
+                meta, words, counts = marshal.loads(zlib.decompress(f.read()))
+        except Exception as e:
+            print(f"分词缓存读取失败，已忽略: {e}")
+            self._remove(key)
+            return None
+        return Counter(dict(zip(words, counts))), meta
+
+    def put(self, key, word_counts, meta=None):
+        """
+        写入词频表：键与次数分两列用 marshal 序列化后 zlib 压缩
+        """
+        words = list(word_counts.keys())
+        counts = [word_counts[w] for w in words]
+        data = zlib.compress(marshal.dumps((meta or {}, words, counts)), 1)
+
+        entry_path = self._entry_path(key)
+        tmp_path = entry_path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, entry_path)
+
+        with self._lock:
+            self._index["entries"][key] = {"size": len(data), "atime": time.time()}
+            self._evict()
+            self._save_index()
+
+    def _evict(self):
+        """按最近使用时间淘汰，直到总大小不超过上限"""
+        entries = self._index["entries"]
+        total = sum(e["size"] for e in entries.values())
+        for key in sorted(entries, key=lambda k: entries[k]["atime"]):
+            if total <= self.max_bytes:
+                break
+            total -= entries.pop(key)["size"]
+            try:
+                os.remove(self._entry_path(key))
+            except OSError:
+                pass
+
+    def _remove(self, key):
+        with self._lock:
+            self._index["entries"].pop(key, None)
+            self._save_index()
+        try:
+            os.remove(self._entry_path(key))
+        except OSError:
+            pass
+
+    def _entry_path(self, key):
+        return os.path.join(self.directory, key + ".bin")
+
+    def _load_index(self):
+        try:
+            with open(self._index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+            if index.get("version") == self.FORMAT_VERSION:
+                return index
+        except (OSError, ValueError):
+            pass
+        return {"version": self.FORMAT_VERSION, "entries": {}, "digests": {}}
+
+    def _save_index(self):
+        tmp_path = self._index_path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._index, f, ensure_ascii=False)
+            os.replace(tmp_path, self._index_path)
+        except OSError as e:
+            print(f"分词缓存索引保存失败: {e}")
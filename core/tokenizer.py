@@ -1,9 +1,21 @@
-import jieba
-import jieba.posseg as pseg  # 引入词性标注模块
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from core.parallel_processor import (DEFAULT_CHUNK_CHARS, chunk_bounds, count_tokens, iter_tokens,
+                                     load_dictionary)
+from core.word_filter import keep_word, segment_mode
 
 
 class Tokenizer:
-    def __init__(self):
+    """
+    进程内分词器 (串行或多线程)
+    小文件不值得启动进程池时使用；与 ParallelTokenizer 共用分词、切块与过滤规则，
+    同一文本无论走哪条路径得到的词频完全相同
+    """
+
+    def __init__(self, chunk_chars=DEFAULT_CHUNK_CHARS):
+        # 切块大小需与 ParallelTokenizer 一致，块边界相同分词结果才相同
+        self.chunk_chars = chunk_chars
         self.stop_words = set()
         # 基础标点停用词
         self.stop_words.update(
@@ -16,59 +28,57 @@ class Tokenizer:
         """设置停用词"""
         self.stop_words.update(set(stop_words_list))
 
+    def count(self, text, seg_mode, dictionary_path=None, threads=1, on_progress=None):
+        """
+        在当前进程内分词并统计原始词频，接口与 ParallelTokenizer.run_parallel 相同
+        :param threads: 线程数，1 为串行
+        :param on_progress: 每完成一块回调一次，进度字典同 run_parallel
+        :return: 全文原始词频 Counter {(词, 词性): 次数}
+        """
+        # 词典在分词前一次性切换好，多个线程共用
+        load_dictionary(dictionary_path)
+        bounds = list(chunk_bounds(text, self.chunk_chars))
+        total = len(bounds)
+        results = Counter()
+        progress = {"done": 0, "total": total, "consumed": 0, "chars": 0}
+
+        def merge(counts, end, chars):
+            results.update(counts)
+            progress["done"] += 1
+            progress["consumed"] = max(progress["consumed"], end)
+            progress["chars"] += chars
+            if on_progress:
+                on_progress(dict(progress))
+
+        if threads <= 1:
+            for start, end in bounds:
+                merge(count_tokens(text[start:end], seg_mode), end, end - start)
+            return results
+
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            futures = [(executor.submit(count_tokens, text[start:end], seg_mode), start, end)
+                       for start, end in bounds]
+            for future, start, end in futures:
+                merge(future.result(), end, end - start)
+        return results
+
     def process_text(self, text, filter_type="all"):
         """
         核心分词逻辑
         :param text: 原始长文本
-        :param filter_type: 过滤模式 "all", "name", "location", "name_location"
+        :param filter_type: 过滤模式 "all", "name", "location", "name_location", "org"
         :return: 空格分隔的词语字符串
         """
         if not text:
             return ""
 
+        # 🟢 与并行路径共用 iter_tokens / keep_word，过滤规则只有一份
+        seg_mode = segment_mode(filter_type)
+        stop_words_set = frozenset(self.stop_words)
         valid_words = []
-
-        # 策略分支
-        if filter_type == "all":
-            # --- 模式 1: 普通分词 (速度快) ---
-            words = jieba.cut(text, cut_all=False)
-            for w in words:
-                w = w.strip().lower()
-                if w and w not in self.stop_words and len(w) > 1:
-                    valid_words.append(w)
-        else:
-            # --- 模式 2: 词性标注分词 (稍慢，但智能) ---
-            words = pseg.cut(text)
-
-            # 🟢 修复点：不能直接 for w, flag in words
-            # 必须先获取对象，再访问 .word 和 .flag 属性
-            for word_pair in words:
-                w = word_pair.word
-                flag = word_pair.flag
-
-                w = w.strip().lower()
-                if not w or w in self.stop_words or len(w) < 2:
-                    continue
-
-                # 根据 flag 筛选
-                keep = False
-                if filter_type == "name":
-                    # nr: 人名
-                    if flag.startswith('nr'): keep = True
-
-                elif filter_type == "location":
-                    # ns: 地名
-                    if flag.startswith('ns'): keep = True
-
-                elif filter_type == "name_location":
-                    # nr: 人名, ns: 地名
-                    if flag.startswith('nr') or flag.startswith('ns'): keep = True
-
-                elif filter_type == "org":
-                    # nt: 机构
-                    if flag.startswith('nt'): keep = True
-
-                if keep:
+        for start, end in chunk_bounds(text, self.chunk_chars):
+            for w, flag in iter_tokens(text[start:end], seg_mode):
+                if keep_word(w, flag, filter_type, stop_words_set, frozenset()):
                     valid_words.append(w)
 
-        return " ".join(valid_words)
\ No newline at end of file
+        return " ".join(valid_words)
@@ -0,0 +1,65 @@
+from collections import Counter
+
+# 实体提取模式 -> 保留的词性前缀
+ENTITY_FLAGS = {
+    "name": ("nr",),                 # nr: 人名
+    "location": ("ns",),             # ns: 地名
+    "name_location": ("nr", "ns"),   # 人名 + 地名
+    "org": ("nt",),                  # nt: 机构
+}
+
+
+def segment_mode(filter_type):
+    """
+    过滤模式对应的分词方式
+    :return: "cut" 普通分词 (速度快) / "pos" 词性标注分词 (实体模式需要)
+    """
+    return "cut" if filter_type == "all" else "pos"
+
+
+def build_filter_sets(stop_words, custom_dict):
+    """
+    构建过滤用的集合
+    :return: (停用词 frozenset, 强制保留词 frozenset)
+    """
+    stop_words_set = frozenset(stop_words) if stop_words else frozenset()
+    # 🟢 建立 VIP 名单 (转小写以匹配)
+    vip_words_set = frozenset(w.strip().lower() for w in custom_dict) if custom_dict else frozenset()
+    return stop_words_set, vip_words_set
+
+
+def filter_counts(raw_counts, filter_type, stop_words_set, vip_words_set):
+    """
+    第二阶段过滤：在原始词频上应用停用词、强制保留词与实体筛选
+    只遍历词表，不涉及分词，屏蔽/恢复词语后可立即得到新结果
+    :param raw_counts: 原始词频 {(词, 词性): 次数}，普通分词模式下词性为 ""
+    :param filter_type: 过滤模式 "all", "name", "location", "name_location", "org"
+    :param stop_words_set / vip_words_set: 见 build_filter_sets (或 CompiledProfile)
+    :return: 过滤后的词频表 Counter
+    """
+    result = Counter()
+    for (w, flag), count in raw_counts.items():
+        if keep_word(w, flag, filter_type, stop_words_set, vip_words_set):
+            result[w] += count
+    return result
+
+
+def keep_word(w, flag, filter_type, stop_words_set, vip_words_set):
+    """
+    单个词是否保留：filter_counts 与 Tokenizer.process_text 共用的判定规则
+    :param w: 已规范化的词 (见 core.parallel_processor.iter_tokens)
+    :param flag: 词性，普通分词模式下为 ""
+    """
+    # 🟢 VIP 检查：强制保留词，无视词性，无视停用词，无视单字限制
+    if w in vip_words_set:
+        return True
+
+    # 普通规则：去空、去停用词、去单字
+    if not w or w in stop_words_set or len(w) < 2:
+        return False
+
+    # 实体模式：按词性筛选
+    if filter_type != "all":
+        entity_flags = ENTITY_FLAGS.get(filter_type)
+        return bool(entity_flags) and flag.startswith(entity_flags)
+    return True
@@ -19,13 +19,22 @@ class StepItem(QFrame):
 
         # 文本区域
         text_layout = QVBoxLayout()
+        title_layout = QHBoxLayout()
         self.lbl_title = QLabel(title)
         self.lbl_title.setStyleSheet("font-size: 15px; font-weight: bold; color: #8E8E93;")
 
+        # 状态徽标 (例如缓存命中)，默认隐藏
+        self.lbl_badge = QLabel("")
+        self.lbl_badge.setVisible(False)
+
+        title_layout.addWidget(self.lbl_title)
+        title_layout.addWidget(self.lbl_badge)
+        title_layout.addStretch()
+
         self.lbl_desc = QLabel("等待中...")
         self.lbl_desc.setStyleSheet("font-size: 13px; color: #AEAEB2;")
 
-        text_layout.addWidget(self.lbl_title)
+        text_layout.addLayout(title_layout)
         text_layout.addWidget(self.lbl_desc)
 
         # 耗时标签
@@ -52,9 +61,18 @@ class StepItem(QFrame):
         self.status_dot.setStyleSheet("color: #E5E5EA; font-size: 20px;")
         self.lbl_title.setStyleSheet("font-size: 15px; font-weight: bold; color: #8E8E93;")
         self.lbl_desc.setStyleSheet("font-size: 13px; color: #AEAEB2;")
+        self.lbl_badge.setVisible(False)
         self.is_running = False
         self.timer.stop()
 
+    def set_badge(self, text, color):
+        """在标题旁显示一个小徽标"""
+        self.lbl_badge.setText(text)
+        self.lbl_badge.setStyleSheet(
+            f"font-size: 11px; font-weight: bold; color: {color}; border: 1px solid {color}; "
+            f"border-radius: 8px; padding: 1px 6px;")
+        self.lbl_badge.setVisible(True)
+
     def set_active(self, desc):
         """设置为进行中"""
         self.status_dot.setStyleSheet("color: #007AFF; font-size: 20px;")  # 蓝色
@@ -158,6 +176,18 @@ class LoadingView(QWidget):
             self.current_step_index = -1
             self.timer.stop()
 
+    def set_cache_status(self, hit):
+        """在“智能分词”步骤上标记分词缓存是否命中"""
+        if hit:
+            self.step_seg.set_badge("⚡ 缓存命中", "#34C759")
+        else:
+            self.step_seg.set_badge("缓存未命中", "#8E8E93")
+
+    def update_detail(self, desc):
+        """刷新当前步骤的描述 (不结束步骤)，用于显示实时进度"""
+        if self.current_step_index >= 0:
+            self._get_item(self.current_step_index).lbl_desc.setText(desc)
+
     def _get_item(self, index):
         if index == 0: return self.step_read
         if index == 1: return self.step_seg
@@ -8,15 +8,24 @@ from PySide6.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, Q
                                QPushButton, QLabel, QFileDialog, QMessageBox,
                                QComboBox, QProgressBar, QTextEdit, QFrame,
                                QStackedWidget, QButtonGroup, QScrollArea, QColorDialog, QMenu, QSizePolicy,
-                               QApplication)
-
+                               QApplication, QCheckBox)
+
+from core.parallel_processor import ParallelTokenizer
+from core.image_export import save_image
+from core.mask_cache import DEFAULT_MEMORY_BYTES, MaskCache
+from core.memory_budget import DEFAULT_RENDER_BUDGET_BYTES
+from core.planner import ExecutionPlanner
+from core.profile_compiler import ProfileCompiler
+from core.rasterizer import TileRasterizer
+from core.token_cache import TokenCache
+from core.word_filter import segment_mode
 from gui.image_viewer import ImageViewer
 from gui.loading_view import LoadingView
 from gui.mask_selector import MaskSelectorDialog
 from gui.profile_manager import ProfileManagerDialog
 from gui.stats_viewer import StatsViewer
 from gui.word_editor import WordEditorDialog
-from gui.workers import WordCloudWorker
+from gui.workers import RecolorWorker, SaveWorker, WordCloudWorker, format_size
 
 DEFAULT_STOP_WORDS = """的
 了
@@ -47,6 +56,36 @@ DEFAULT_STOP_WORDS = """的
 自己
 这"""
 
+# 配色方案：(显示名称, matplotlib colormap 名称)
+COLOR_MAPS = [
+    ("翠绿 (viridis)", "viridis"),
+    ("等离子 (plasma)", "plasma"),
+    ("岩浆 (magma)", "magma"),
+    ("冷暖 (coolwarm)", "coolwarm"),
+    ("彩虹 (rainbow)", "rainbow"),
+    ("柔和 (Set2)", "Set2"),
+    ("深色 (Dark2)", "Dark2"),
+]
+
+# 保存对话框的文件类型
+PNG_FILTER = "PNG 图片 (*.png)"
+PNG_FAST_FILTER = "PNG 快速保存 (*.png)"
+PNG_SMALL_FILTER = "PNG 最小体积，较慢 (*.png)"
+WEBP_FILTER = "WebP 无损 (*.webp)"
+JPEG_FILTER = "JPEG 高质量 (*.jpg)"
+SVG_FILTER = "SVG 矢量图 (*.svg)"
+SVG_EMBED_FILTER = "SVG 矢量图，嵌入字体 (*.svg)"
+# 位图类型对应的 (格式, PNG 压缩级别, PNG 逐行选择过滤方式)
+IMAGE_FILTERS = {
+    PNG_FILTER: ("PNG", 6, False),
+    PNG_FAST_FILTER: ("PNG", 1, False),
+    PNG_SMALL_FILTER: ("PNG", 9, True),
+    WEBP_FILTER: ("WEBP", 6, False),
+    JPEG_FILTER: ("JPEG", 6, False),
+}
+# 对话框中未选类型时按扩展名推断
+IMAGE_EXTENSIONS = {".png": PNG_FILTER, ".webp": WEBP_FILTER, ".jpg": JPEG_FILTER, ".jpeg": JPEG_FILTER}
+
 APPLE_ULTRA_QSS = """
 /* 全局字体 */
 QWidget { font-family: "Segoe UI", "Microsoft YaHei", sans-serif; font-size: 13px; color: #1D1D1F; }
@@ -138,12 +177,63 @@ class MainWindow(QMainWindow):
         self.current_file = None
         self.generated_image = None
         self.worker = None
+        # 🟢 常驻分词进程池：首次使用时创建，关闭窗口时释放
+        self.tokenizer = ParallelTokenizer()
+        # 🟢 分词结果磁盘缓存：只改蒙版/颜色/分辨率时跳过读取与分词
+        try:
+            self.token_cache = TokenCache()
+        except OSError as e:
+            print(f"分词缓存不可用: {e}")
+            self.token_cache = None
+        # 🟢 配置方案编译器：自定义词典/停用词只在方案内容变化时重新编译
+        try:
+            self.profile_compiler = ProfileCompiler()
+        except OSError as e:
+            print(f"配置方案缓存不可用: {e}")
+            self.profile_compiler = None
+        # 执行计划：小文件在进程内分词，大文件才使用进程池
+        try:
+            self.planner = ExecutionPlanner()
+        except OSError as e:
+            print(f"分词校准数据不可用: {e}")
+            self.planner = None
+        # 🟢 处理后蒙版缓存：同一蒙版只换颜色/词语时不再重复缩放与计算轮廓
+        try:
+            self.mask_cache = MaskCache()
+        except OSError as e:
+            print(f"蒙版缓存不可用: {e}")
+            self.mask_cache = None
+        # 🟢 最终图片分块并行绘制 (常驻进程，单核机器上自动退回串行)
+        self.rasterizer = TileRasterizer()
+        # 高分辨率输出时在全分辨率下微调小号词 (settings.json 的 refine_layout)
+        self.refine_layout = True
+        # 🟢 渲染内存预算 (settings.json 的 render_memory_mb)；超出时 "downscale" 缩小输出，"refuse" 拒绝生成
+        self.render_memory_budget = DEFAULT_RENDER_BUDGET_BYTES
+        self.render_memory_policy = "downscale"
+        # PDF 只取文字层、跳过版面分析 (settings.json 的 pdf_text_only)
+        self.pdf_text_only = False
         self.current_mask_file = None
         self.current_bg_color = "#FFFFFF"
         self.profiles = {"默认配置": {"custom_dict": "", "stop_words": DEFAULT_STOP_WORDS}}
         self.current_profile_name = "默认配置"
         self.is_loading_profile = False
 
+        # 🟢 上次分析的原始词频及其上下文，用于屏蔽/恢复词语后快速重新生成
+        self.last_analysis = None
+        self.refilter_pending = False
+        # 当前生成是否已显示预览 (显示后允许切换视图查看)
+        self.preview_shown = False
+        # 🟢 上次生成的 WordCloudGenerator (含排版)：只改背景/配色时直接重新着色，不再重新生成
+        self.last_generator = None
+        self.recolor_worker = None
+        self.recolor_pending = False
+        # 🟢 后台保存图片，避免编码大图时界面卡住
+        self.save_worker = None
+        self.refilter_timer = QTimer(self)
+        self.refilter_timer.setSingleShot(True)
+        self.refilter_timer.setInterval(500)
+        self.refilter_timer.timeout.connect(self.start_refilter)
+
         self.timer = QTimer()
         self.timer.timeout.connect(self.update_timer)
         self.elapsed_seconds = 0
@@ -189,9 +279,16 @@ class MainWindow(QMainWindow):
         btn_select = QPushButton("📂 浏览...")
         btn_select.setFixedWidth(80)
         btn_select.setCursor(Qt.PointingHandCursor)
+        btn_select.setToolTip("可多选文件，合并为一个语料")
         btn_select.clicked.connect(self.select_file)
+        # 🟢 语料模式：整个文件夹 (含子文件夹) 中的 txt/docx/pdf 一起分析
+        btn_folder = QPushButton("📁 文件夹")
+        btn_folder.setFixedWidth(80)
+        btn_folder.setCursor(Qt.PointingHandCursor)
+        btn_folder.clicked.connect(self.select_folder)
         row_file.addWidget(self.lbl_file, 1)
         row_file.addWidget(btn_select)
+        row_file.addWidget(btn_folder)
         l_file.addLayout(row_file)
         card_layout.addWidget(card_file)
 
@@ -283,7 +380,14 @@ class MainWindow(QMainWindow):
         bg_layout.addWidget(btn_bg)
         l_settings.addWidget(bg_widget, 3, 1)
 
-        l_settings.addWidget(self.create_sub_label("形状蒙版:"), 4, 0, 1, 2)
+        l_settings.addWidget(self.create_sub_label("配色:"), 4, 0, 1, 2)
+        self.combo_color_map = QComboBox()
+        self.combo_color_map.addItems([name for name, _ in COLOR_MAPS])
+        self.combo_color_map.setFixedHeight(28)
+        self.combo_color_map.currentIndexChanged.connect(self.apply_colors)
+        l_settings.addWidget(self.combo_color_map, 5, 0, 1, 2)
+
+        l_settings.addWidget(self.create_sub_label("形状蒙版:"), 6, 0, 1, 2)
         mask_row = QHBoxLayout()
         self.lbl_mask_preview = QLabel("无")
         self.lbl_mask_preview.setFixedSize(60, 60)
@@ -309,7 +413,12 @@ class MainWindow(QMainWindow):
         btn_vbox.addStretch()
         mask_row.addWidget(self.lbl_mask_preview)
         mask_row.addLayout(btn_vbox)
-        l_settings.addLayout(mask_row, 5, 0, 1, 2)
+        l_settings.addLayout(mask_row, 7, 0, 1, 2)
+
+        # 🟢 只要矢量图 (打印尺寸) 时不绘制全分辨率位图，保存时从排版直接写 SVG
+        self.chk_vector_only = QCheckBox("仅矢量输出 (SVG)")
+        self.chk_vector_only.setToolTip("跳过高清位图，只显示预览；保存时从排版直接导出 SVG，或逐条绘制写出 PNG")
+        l_settings.addWidget(self.chk_vector_only, 8, 0, 1, 2)
         card_settings.layout().addWidget(grid_container)
         card_layout.addWidget(card_settings)
         card_layout.addStretch()
@@ -332,6 +441,7 @@ class MainWindow(QMainWindow):
         self.progress_bar = QProgressBar()
         self.progress_bar.setVisible(False)
         self.progress_bar.setFixedHeight(4)
+        self.progress_bar.setTextVisible(False)
         h_status.addWidget(self.lbl_status)
         h_status.addStretch()
 
@@ -438,7 +548,7 @@ class MainWindow(QMainWindow):
             self.btn_generate.setEnabled(False)
 
     def switch_view(self, id):
-        if self.worker and self.worker.isRunning():
+        if self.worker and self.worker.isRunning() and not self.preview_shown:
             self.stack.setCurrentIndex(2)
         else:
             self.stack.setCurrentIndex(id)
@@ -462,26 +572,49 @@ class MainWindow(QMainWindow):
 
         self.btn_generate.setEnabled(False)
         self.btn_generate.setText("生成中...")
+        self.progress_bar.setValue(0)
         self.progress_bar.setVisible(True)
         self.stack.setCurrentIndex(2)
         self.loading_view.start_loading()
         self.lbl_perf.setText("")
 
+        self._launch_worker()
+
+    def start_refilter(self):
+        """
+        屏蔽/恢复词语后快速重新生成：复用上次分词得到的原始词频，只重新过滤和渲染
+        文件、提取方式或强制保留词变化后原始词频失效，需要点击“开始生成”
+        """
+        if not self.last_analysis or not self.current_file: return
+        if (self.worker and self.worker.isRunning()) or (self.recolor_worker and self.recolor_worker.isRunning()):
+            self.refilter_pending = True
+            return
+
+        custom_dict = self._current_custom_dict()
+        analysis = self.last_analysis
+        if (analysis["file"] != self.current_file
+                or analysis["seg_mode"] != segment_mode(self._current_filter_type())
+                or analysis["custom_dict"] != custom_dict):
+            return
+
+        self.btn_generate.setEnabled(False)
+        self.btn_generate.setText("生成中...")
+        self.progress_bar.setValue(0)
+        self.progress_bar.setVisible(True)
+        self.lbl_status.setText("正在应用屏蔽词...")
+
+        self._launch_worker(raw_counts=analysis["raw_counts"])
+
+    def _launch_worker(self, raw_counts=None):
+        # 保存图片时进度条可能处于忙碌状态
+        self.progress_bar.setRange(0, 100)
         bg_color = self.current_bg_color
-        custom_dict = [line.strip() for line in self.custom_dict_input.toPlainText().split('\n') if line.strip()]
+        custom_dict = self._current_custom_dict()
         stop_words = [line.strip() for line in self.stop_words_input.toPlainText().split('\n') if line.strip()]
         res_text = self.combo_res.currentText()
         res_setting = "auto" if "自动" in res_text else res_text.split(' ')[0]
         max_words = int(self.combo_max_words.currentText().split(' ')[0])
-        mode_text = self.combo_mode.currentText()
-        if "人名" in mode_text and "地名" in mode_text:
-            filter_type = "name_location"
-        elif "人名" in mode_text:
-            filter_type = "name"
-        elif "地名" in mode_text:
-            filter_type = "location"
-        else:
-            filter_type = "all"
+        filter_type = self._current_filter_type()
 
         self.worker = WordCloudWorker(
             file_path=self.current_file,
@@ -491,14 +624,65 @@ class MainWindow(QMainWindow):
             stop_words=stop_words,
             resolution_setting=res_setting,
             max_words=max_words,
-            filter_type=filter_type
+            filter_type=filter_type,
+            tokenizer=self.tokenizer,
+            token_cache=self.token_cache,
+            raw_counts=raw_counts,
+            profile_compiler=self.profile_compiler,
+            planner=self.planner,
+            mask_cache=self.mask_cache,
+            refine_layout=self.refine_layout,
+            rasterizer=self.rasterizer,
+            color_map=self._current_color_map(),
+            vector_only=self.chk_vector_only.isChecked(),
+            memory_budget=self.render_memory_budget,
+            downscale_to_budget=self.render_memory_policy != "refuse",
+            pdf_text_only=self.pdf_text_only
         )
+        # 记录本次分析的上下文，原始词频只在上下文一致时复用
+        context = {"file": self.current_file, "seg_mode": segment_mode(filter_type), "custom_dict": custom_dict}
+        self.worker.analysis_ready.connect(lambda counts: self.on_analysis_ready(context, counts))
         self.worker.progress_step.connect(self.loading_view.update_step)
+        self.worker.progress_detail.connect(self.loading_view.update_detail)
+        self.worker.progress_percent.connect(self.progress_bar.setValue)
+        self.worker.cache_status.connect(self.loading_view.set_cache_status)
+        self.worker.preview_ready.connect(self.on_preview_ready)
         self.worker.finished.connect(self.on_generation_finished)
         self.worker.error.connect(self.on_generation_error)
         self.worker.start()
 
+    def _current_custom_dict(self):
+        return [line.strip() for line in self.custom_dict_input.toPlainText().split('\n') if line.strip()]
+
+    def _current_color_map(self):
+        return COLOR_MAPS[max(0, self.combo_color_map.currentIndex())][1]
+
+    def _current_filter_type(self):
+        mode_text = self.combo_mode.currentText()
+        if "人名" in mode_text and "地名" in mode_text:
+            return "name_location"
+        elif "人名" in mode_text:
+            return "name"
+        elif "地名" in mode_text:
+            return "location"
+        return "all"
+
+    def on_analysis_ready(self, context, raw_counts):
+        self.last_analysis = dict(context, raw_counts=raw_counts)
+
+    def on_preview_ready(self, pil_image):
+        """先显示低分辨率预览，全分辨率图片完成后再替换"""
+        if self.worker is None or self.sender() is not self.worker:
+            return
+        self.preview_shown = True
+        self.image_viewer.set_image(QPixmap.fromImage(ImageQt(pil_image)))
+        if self.view_group.button(0).isChecked():
+            self.stack.setCurrentIndex(0)
+        self.lbl_status.setText("👀 预览 (正在渲染高清图片...)")
+
     def on_generation_finished(self, pil_image, stats_data, timings):
+        self.preview_shown = False
+        is_refilter = self.worker is not None and self.worker.raw_counts is not None
         self.btn_generate.setEnabled(True)
         self.btn_generate.setText("开始生成")
         self.btn_save.setEnabled(True)
@@ -507,6 +691,7 @@ class MainWindow(QMainWindow):
         perf_text = f"耗时: {timings['total']:.1f}s"
         self.lbl_perf.setText(perf_text)
         self.generated_image = pil_image
+        self.last_generator = self.worker.generator if self.worker is not None else None
         QApplication.processEvents()
         target_view = 0 if self.view_group.button(0).isChecked() else 1
         self.stack.setCurrentIndex(target_view)
@@ -514,13 +699,75 @@ class MainWindow(QMainWindow):
         pix = QPixmap.fromImage(qim)
         self.image_viewer.set_image(pix)
         current_stop_words = [line.strip() for line in self.stop_words_input.toPlainText().split('\n') if line.strip()]
-        self.stats_viewer.set_data(stats_data, blocked_words=current_stop_words)
+        if is_refilter:
+            # 已屏蔽的词不再出现在结果中，但保留在表格里 (灰色)，方便随时恢复
+            stats_data = dict(stats_data)
+            blocked = set(current_stop_words)
+            for word, count in self.stats_viewer.current_data:
+                if word in blocked and word not in stats_data:
+                    stats_data[word] = count
+            search_text = self.stats_viewer.search_input.text()
+            self.stats_viewer.set_data(stats_data, blocked_words=current_stop_words)
+            self.stats_viewer.search_input.setText(search_text)
+            self.lbl_status.setText("✅ 已按最新屏蔽词更新")
+        else:
+            self.stats_viewer.set_data(stats_data, blocked_words=current_stop_words)
+        self._run_pending_refilter()
+
+    def _run_pending_refilter(self):
+        if self.refilter_pending:
+            # 重新生成时会用上最新的背景与配色
+            self.refilter_pending = False
+            self.recolor_pending = False
+            QTimer.singleShot(0, self.start_refilter)
+        elif self.recolor_pending:
+            self.recolor_pending = False
+            QTimer.singleShot(0, self.apply_colors)
+
+    def apply_colors(self):
+        """
+        背景或配色变化后立即作用于当前词云：沿用上次的排版重新着色，不重新读取、分词与排版
+        尚未生成过词云时只记下设置，下次生成时生效
+        """
+        if self.last_generator is None:
+            return
+        # 重新着色会修改排版对象，保存 (SVG / 逐条 PNG) 期间也要等待
+        if ((self.worker and self.worker.isRunning()) or (self.recolor_worker and self.recolor_worker.isRunning())
+                or (self.save_worker and self.save_worker.isRunning())):
+            self.recolor_pending = True
+            return
+
+        bg_color = self.current_bg_color
+        self.recolor_worker = RecolorWorker(self.last_generator, bg_color=bg_color,
+                                            color_map=self._current_color_map())
+        self.recolor_worker.finished.connect(self.on_recolor_finished)
+        self.recolor_worker.error.connect(self.on_recolor_error)
+        self.lbl_status.setText("正在更新配色...")
+        self.recolor_worker.start()
+
+    def on_recolor_finished(self, pil_image, seconds):
+        # 期间已重新生成过词云时丢弃旧排版的结果，但仍要处理等它结束才执行的重新生成/着色
+        if self.sender().generator is not self.last_generator:
+            self._run_pending_refilter()
+            return
+        self.generated_image = pil_image
+        self.image_viewer.set_image(QPixmap.fromImage(ImageQt(pil_image)))
+        self.lbl_status.setText(f"✅ 已更新配色 ({seconds:.1f}s)")
+        self._run_pending_refilter()
+
+    def on_recolor_error(self, err_msg):
+        # 不重试失败的着色，但等待中的重新生成照常进行
+        self.recolor_pending = False
+        self.lbl_status.setText(f"配色更新失败: {err_msg}")
+        self._run_pending_refilter()
 
     def on_generation_error(self, err_msg):
+        self.preview_shown = False
         self.loading_view.stop_loading()
         self.btn_generate.setEnabled(True)
         self.btn_generate.setText("开始生成")
         self.progress_bar.setVisible(False)
+        self.refilter_pending = False
         self.switch_view(0)
         msg = QMessageBox(self)
         msg.setWindowTitle("生成失败")
@@ -530,15 +777,34 @@ class MainWindow(QMainWindow):
         msg.exec()
 
     def select_file(self):
-        file_path, _ = QFileDialog.getOpenFileName(self, "选择文档", "",
-                                                   "Text Files (*.txt *.docx *.pdf);;All Files (*)")
-        if file_path:
-            self.current_file = file_path
-            self.lbl_file.setText(os.path.basename(file_path))
-            self.lbl_file.setStyleSheet("color: #007AFF; font-weight: 600;")
-            self.btn_generate.setEnabled(True)
-            self.lbl_status.setText("文件已加载")
-            self.update_generate_button_state()
+        file_paths, _ = QFileDialog.getOpenFileNames(self, "选择文档", "",
+                                                     "Text Files (*.txt *.docx *.pdf);;All Files (*)")
+        if len(file_paths) == 1:
+            self._set_source(file_paths[0], os.path.basename(file_paths[0]))
+        elif file_paths:
+            # 多个文件：语料模式，合并统计
+            self._set_source(file_paths, f"{len(file_paths)} 个文件 (语料)")
+
+    def select_folder(self):
+        folder = QFileDialog.getExistingDirectory(self, "选择语料文件夹")
+        if folder:
+            self._set_source([folder], f"📁 {os.path.basename(folder) or folder} (语料)")
+
+    def _set_source(self, source, label):
+        """
+        :param source: 单个文件路径，或语料模式下的文件/文件夹路径列表 (传给 WordCloudWorker 的 file_path)
+        """
+        self.current_file = source
+        self.lbl_file.setText(label)
+        self.lbl_file.setStyleSheet("color: #007AFF; font-weight: 600;")
+        self.btn_generate.setEnabled(True)
+        self.lbl_status.setText("文件已加载")
+        self.update_generate_button_state()
+        # 选好文件后提前预热进程池，点击“开始生成”时即可直接分词
+        dictionary_path = None
+        if self.profile_compiler:
+            dictionary_path = self.profile_compiler.find_dictionary(self._current_custom_dict())
+        self.tokenizer.warm_up(dictionary_path)
 
     def pick_bg_color(self):
         menu = QMenu(self)
@@ -551,6 +817,7 @@ class MainWindow(QMainWindow):
                 self.current_bg_color = color.name()
                 self.lbl_color_preview.setStyleSheet(
                     f"background-color: {self.current_bg_color}; border: 1px solid #CCC; border-radius: 10px;")
+                self.apply_colors()
         elif action == act_trans:
             self.current_bg_color = "transparent"
             self.lbl_color_preview.setStyleSheet("""
@@ -559,6 +826,7 @@ class MainWindow(QMainWindow):
                                   linear-gradient(45deg, #E0E0E0 25%, transparent 25%, transparent 75%, #E0E0E0 75%, #E0E0E0);
                 background-size: 6px 6px; background-position: 0 0, 3px 3px;
             """)
+            self.apply_colors()
 
     def clear_mask(self):
         self.current_mask_file = None
@@ -569,15 +837,97 @@ class MainWindow(QMainWindow):
 
     def save_image(self):
         if not self.generated_image: return
-        save_path, _ = QFileDialog.getSaveFileName(self, "保存图片", "wordcloud.png", "PNG Images (*.png)")
-        if save_path:
-            self.generated_image.save(save_path)
-            msg = QMessageBox(self)
-            msg.setWindowTitle("保存成功")
-            msg.setText(f"图片已保存至:\n{save_path}")
-            msg.setIcon(QMessageBox.Information)
-            msg.addButton("确定", QMessageBox.AcceptRole)
-            msg.exec()
+        if self.save_worker and self.save_worker.isRunning(): return
+        # 仅矢量输出时内存中只有预览图：PNG 改为逐条绘制并写盘 (不生成整张位图)，不支持其他位图格式
+        generator = self.last_generator
+        vector_only = generator is not None and generator.vector_only
+        if vector_only and self._recoloring():
+            self.lbl_status.setText("正在更新配色，请完成后再保存")
+            return
+        filters = [PNG_FILTER, PNG_FAST_FILTER, PNG_SMALL_FILTER]
+        if not vector_only:
+            filters.append(WEBP_FILTER)
+            # JPEG 没有透明通道，只提供给实色背景
+            if self.generated_image.mode == "RGB":
+                filters.append(JPEG_FILTER)
+        filters += [SVG_FILTER, SVG_EMBED_FILTER]
+        default_name = "wordcloud.svg" if vector_only else "wordcloud.png"
+        save_path, selected_filter = QFileDialog.getSaveFileName(self, "保存图片", default_name, ";;".join(filters))
+        if not save_path: return
+
+        extension = os.path.splitext(save_path)[1].lower()
+        export_svg = selected_filter in (SVG_FILTER, SVG_EMBED_FILTER) or extension == ".svg"
+        # SVG 与逐条绘制的 PNG 在后台线程读取排版对象，重新着色会中途改写它 (颜色、背景、模式)；
+        # 选择文件期间也可能开始等待中的着色，所以选完再检查一次
+        if (export_svg or vector_only) and self._recoloring():
+            self.lbl_status.setText("正在更新配色，请完成后再保存")
+            return
+        if export_svg:
+            if generator is None:
+                QMessageBox.critical(self, "保存失败", "没有可导出的词云，请先生成")
+                return
+            embed_font = selected_filter == SVG_EMBED_FILTER
+            save = lambda on_progress: generator.save_svg(save_path, embed_font=embed_font)
+            reports_progress = False
+        else:
+            if selected_filter not in filters:
+                selected_filter = IMAGE_EXTENSIONS.get(extension, PNG_FILTER)
+            image_format, compress_level, optimize = IMAGE_FILTERS[selected_filter]
+            if vector_only:
+                save = lambda on_progress: generator.save_png(save_path, compress_level, optimize, on_progress)
+            else:
+                image = self.generated_image
+                save = lambda on_progress: save_image(image, save_path, image_format, compress_level, optimize,
+                                                      on_progress)
+            reports_progress = image_format == "PNG"
+
+        self.save_worker = SaveWorker(save, save_path, reports_progress)
+        self.save_worker.progress.connect(self.on_save_progress)
+        self.save_worker.finished.connect(self.on_save_finished)
+        self.save_worker.error.connect(self.on_save_error)
+        self.btn_save.setEnabled(False)
+        self.lbl_status.setText("正在保存图片...")
+        self.save_worker.start()
+
+    def _generating(self):
+        return self.worker is not None and self.worker.isRunning()
+
+    def _recoloring(self):
+        return self.recolor_worker is not None and self.recolor_worker.isRunning()
+
+    def on_save_progress(self, percent):
+        # 生成进行中时进度条属于生成任务
+        if self._generating(): return
+        self.progress_bar.setVisible(True)
+        if percent < 0:
+            # 无法报告中间进度的格式显示为忙碌状态
+            self.progress_bar.setRange(0, 0)
+        else:
+            self.progress_bar.setRange(0, 100)
+            self.progress_bar.setValue(percent)
+
+    def _finish_save(self):
+        self.btn_save.setEnabled(self.generated_image is not None)
+        if not self._generating():
+            self.progress_bar.setRange(0, 100)
+            self.progress_bar.setVisible(False)
+        self._run_pending_refilter()
+
+    def on_save_finished(self, save_path, seconds, size):
+        self._finish_save()
+        size_text = format_size(size)
+        self.lbl_status.setText(f"✅ 已保存 ({size_text}，编码 {seconds:.1f}s)")
+        msg = QMessageBox(self)
+        msg.setWindowTitle("保存成功")
+        msg.setText(f"图片已保存至:\n{save_path}\n\n文件大小: {size_text}  |  编码耗时: {seconds:.1f}s")
+        msg.setIcon(QMessageBox.Information)
+        msg.addButton("确定", QMessageBox.AcceptRole)
+        msg.exec()
+
+    def on_save_error(self, err_msg):
+        self._finish_save()
+        self.lbl_status.setText("保存失败")
+        QMessageBox.critical(self, "保存失败", err_msg)
 
     def refresh_profile_combo(self):
         self.is_loading_profile = True
@@ -655,6 +1005,8 @@ class MainWindow(QMainWindow):
                 self.lbl_status.setText(f"✅ 已{'屏蔽' if is_block else '恢复'} “{words_list[0]}”")
             else:
                 self.lbl_status.setText(f"✅ 批量处理 {len(words_list)} 个词")
+            # 🟢 稍作合并后基于上次分词结果重新生成 (连续点击只触发一次)
+            self.refilter_timer.start()
 
     def load_settings(self):
         config_path = "settings.json"
@@ -674,6 +1026,17 @@ class MainWindow(QMainWindow):
                 if "max_words_index" in config: self.combo_max_words.setCurrentIndex(config["max_words_index"])
                 if "res_index" in config: self.combo_res.setCurrentIndex(config["res_index"])
                 if "mode_index" in config: self.combo_mode.setCurrentIndex(config["mode_index"])
+                if "color_map_index" in config: self.combo_color_map.setCurrentIndex(config["color_map_index"])
+                if "vector_only" in config: self.chk_vector_only.setChecked(bool(config["vector_only"]))
+                if "chunk_chars" in config: self.tokenizer.chunk_chars = max(1024, int(config["chunk_chars"]))
+                if "refine_layout" in config: self.refine_layout = bool(config["refine_layout"])
+                if "pdf_text_only" in config: self.pdf_text_only = bool(config["pdf_text_only"])
+                if "render_memory_mb" in config:
+                    self.render_memory_budget = max(64, int(config["render_memory_mb"])) * 1024 * 1024
+                if config.get("render_memory_policy") in ("downscale", "refuse"):
+                    self.render_memory_policy = config["render_memory_policy"]
+                if "mask_cache_mb" in config and self.mask_cache:
+                    self.mask_cache.set_memory_budget(max(0, int(config["mask_cache_mb"])) * 1024 * 1024)
                 if "profiles" in config:
                     self.profiles = config["profiles"]
                     self.current_profile_name = config.get("current_profile_name", "默认配置")
@@ -691,6 +1054,14 @@ class MainWindow(QMainWindow):
             "max_words_index": self.combo_max_words.currentIndex(),
             "res_index": self.combo_res.currentIndex(),
             "mode_index": self.combo_mode.currentIndex(),
+            "color_map_index": self.combo_color_map.currentIndex(),
+            "vector_only": self.chk_vector_only.isChecked(),
+            "chunk_chars": self.tokenizer.chunk_chars,
+            "refine_layout": self.refine_layout,
+            "mask_cache_mb": (self.mask_cache.memory_bytes if self.mask_cache else DEFAULT_MEMORY_BYTES) // (1024 * 1024),
+            "render_memory_mb": self.render_memory_budget // (1024 * 1024),
+            "render_memory_policy": self.render_memory_policy,
+            "pdf_text_only": self.pdf_text_only,
             "profiles": self.profiles,
             "current_profile_name": self.current_profile_name
         }
@@ -708,4 +1079,16 @@ class MainWindow(QMainWindow):
 
     def closeEvent(self, event):
         self.save_settings()
+        if self.worker and self.worker.isRunning():
+            # 正在分词的任务会因进程池关闭而中止，窗口已关闭，不再弹出“生成失败”
+            self.worker.error.disconnect()
+        # 不等正在进行的分词：直接终止子进程，分词线程随即退出
+        self.tokenizer.shutdown()
+        if self.worker:
+            self.worker.wait()
+        if self.recolor_worker:
+            self.recolor_worker.wait()
+        if self.save_worker:
+            self.save_worker.wait()
+        self.rasterizer.shutdown()
         event.accept()
\ No newline at end of file
@@ -1,24 +1,60 @@
-import multiprocessing
 import os
 import time
-from collections import Counter
 
 from PySide6.QtCore import QThread, Signal
 
 from core.file_loader import FileLoader
-from core.generator import WordCloudGenerator
-from core.parallel_processor import ParallelTokenizer
+from core.font_cache import FONT_CACHE
+from core.generator import PREVIEW_WIDTH, WordCloudGenerator
+from core.memory_budget import peak_rss
+from core.parallel_processor import ParallelTokenizer, TOKENIZER_VERSION, dictionary_loaded
+from core.planner import PROCESS, THREAD
+from core.profile_compiler import ProfileCompiler
+from core.tokenizer import Tokenizer
+from core.word_filter import filter_counts, segment_mode
+
+
+def format_size(size):
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
 
 
 class WordCloudWorker(QThread):
     finished = Signal(object, dict, dict)
     error = Signal(str)
     progress_step = Signal(int, str, str)
+    # 当前步骤的实时进度描述 (例如流式读取的吞吐量)
+    progress_detail = Signal(str)
+    # 当前步骤的完成百分比 (0-100)
+    progress_percent = Signal(int)
+    # 分词缓存是否命中
+    cache_status = Signal(bool)
+    # 分词完成后发出原始词频 {(词, 词性): 次数}，供屏蔽/恢复词语后快速重新筛选
+    analysis_ready = Signal(object)
+    # 渲染过程中的低分辨率预览 (PIL.Image)，与最终图片是同一份排版
+    preview_ready = Signal(object)
+
+    # 超过该大小的文件默认走流式读取，峰值内存不随文件大小增长
+    STREAMING_THRESHOLD = 64 * 1024 * 1024
+    # 分辨率下拉框的预设档位
+    RESOLUTION_PRESETS = {
+        "1080P": (1920, 1080),
+        "2K": (2560, 1440),
+        "4K": (3840, 2160),
+        "8K": (7680, 4320),
+    }
 
     def __init__(self, file_path, font_path=None, bg_color='white', mask_path=None,
                  custom_dict=None, stop_words=None, resolution_setting="auto",
-                 max_words=1000, filter_type="all"):
+                 max_words=1000, filter_type="all", tokenizer=None, streaming=None,
+                 token_cache=None, raw_counts=None, profile_compiler=None, planner=None,
+                 mask_cache=None, refine_layout=True, rasterizer=None, color_map='viridis',
+                 vector_only=False, memory_budget=None, downscale_to_budget=True, pdf_text_only=False):
         super().__init__()
+        # 文件路径；语料模式下为多个文件/文件夹路径组成的列表 (见 FileLoader.collect_files)
         self.file_path = file_path
         self.font_path = font_path
         self.bg_color = bg_color
@@ -28,6 +64,34 @@ class WordCloudWorker(QThread):
         self.resolution_setting = resolution_setting
         self.max_words = max_words
         self.filter_type = filter_type
+        # 🟢 由 MainWindow 持有的常驻分词进程池，未提供时临时创建
+        self.tokenizer = tokenizer
+        # 流式模式：None 表示按文件大小自动选择
+        self.streaming = streaming
+        # 分词结果磁盘缓存 (TokenCache)，为 None 时不使用缓存
+        self.token_cache = token_cache
+        # 上次分析得到的原始词频；提供时跳过读取与分词，只做过滤与渲染
+        self.raw_counts = raw_counts
+        # 配置方案编译器 (ProfileCompiler)，未提供时临时创建
+        self.profile_compiler = profile_compiler
+        # 执行计划 (ExecutionPlanner)：小文件改在进程内分词；为 None 时始终使用进程池
+        self.planner = planner
+        # 处理后蒙版缓存 (MaskCache)，为 None 时每次重新处理蒙版
+        self.mask_cache = mask_cache
+        # 高分辨率输出在缩小画布上排版后，是否在全分辨率下微调小号词
+        self.refine_layout = refine_layout
+        # 🟢 最终图片的分块并行绘制器 (TileRasterizer)，为 None 时串行绘制
+        self.rasterizer = rasterizer
+        self.color_map = color_map
+        # 只需矢量输出：跳过全分辨率位图，结果为预览图，保存时从排版直接写 SVG
+        self.vector_only = vector_only
+        # 🟢 渲染内存预算 (字节)：预计超出时缩小输出尺寸，downscale_to_budget 为 False 时拒绝生成
+        self.memory_budget = memory_budget
+        self.downscale_to_budget = downscale_to_budget
+        # PDF 只取文字层，跳过 pdfplumber 的版面分析 (快数十倍)
+        self.pdf_text_only = pdf_text_only
+        # 完成后保留所用的 WordCloudGenerator (含排版结果)，供 RecolorWorker 只换颜色重新绘制
+        self.generator = None
 
     def run(self):
         timings = {}
@@ -36,59 +100,129 @@ class WordCloudWorker(QThread):
         try:
             self.progress_step.emit(0, "正在加载文件内容...", "")
             t_start = time.time()
-            file_size = os.path.getsize(self.file_path)
+            corpus_files = None
+            if self._is_corpus():
+                corpus_files = FileLoader.collect_files(self.file_path)
+                if not corpus_files:
+                    self.error.emit("所选文件夹中没有可读取的文档 (.txt / .docx / .pdf)！")
+                    return
+                file_size = sum(os.path.getsize(path) for path in corpus_files)
+            else:
+                file_size = os.path.getsize(self.file_path)
             size_str = self._format_size(file_size)
+            mode_name = self._get_mode_name()
 
-            text = FileLoader.read_file(self.file_path)
-            if not text.strip():
-                self.error.emit("文件中没有任何文字内容！")
-                return
+            # 🟢 配置方案编译产物 (词典 + 冻结的停用词/保留词集合)，方案不变时直接复用
+            profile = self._compile_profile()
 
-            char_count = len(text)
-            read_summary = f"大小: {size_str} | 字数: {char_count:,}"
-            timings['read'] = time.time() - t_start
+            balance = None
+            if self.raw_counts is not None:
+                # 🟢 复用上次的原始词频 (例如在数据表中屏蔽/恢复词语后)，不读文件也不分词
+                raw_counts = self.raw_counts
+                timings['read'] = time.time() - t_start
+                self.progress_step.emit(1, "正在重新筛选词语...", f"大小: {size_str} | 复用上次分词结果")
+                t_start = time.time()
+            else:
+                # 🟢 先查分词缓存：文本与分词设置不变时直接复用原始词频
+                cache_key = self._cache_key()
+                cached = self.token_cache.get(cache_key) if cache_key else None
+                if cache_key:
+                    self.cache_status.emit(cached is not None)
 
-            cpu_cores = multiprocessing.cpu_count()
-            mode_name = self._get_mode_name()
-            self.progress_step.emit(1, f"正在进行并行分词 ({cpu_cores}核)...", read_summary)
-            t_start = time.time()
+                if cached:
+                    raw_counts, meta = cached
+                    timings['read'] = time.time() - t_start
+                    self.progress_step.emit(1, "已从缓存载入分词结果",
+                                            f"大小: {size_str} | 字数: {meta.get('chars', 0):,} | ⚡ 缓存命中")
+                    t_start = time.time()
+                else:
+                    owns_tokenizer = self.tokenizer is None
+                    tokenizer = ParallelTokenizer() if owns_tokenizer else self.tokenizer
+                    try:
+                        if corpus_files is not None:
+                            result = self._tokenize_corpus(tokenizer, profile, corpus_files, size_str, timings)
+                        else:
+                            result = self._tokenize(tokenizer, profile, file_size, size_str, timings)
+                    finally:
+                        if owns_tokenizer:
+                            tokenizer.shutdown()
+                    if result is None:
+                        return
+                    raw_counts, char_count, t_start, balance = result
+                    if cache_key and raw_counts:
+                        self._store_cache(cache_key, raw_counts, char_count)
+                self.analysis_ready.emit(raw_counts)
 
-            clean_words_list = ParallelTokenizer.run_parallel(
-                text,
-                self.filter_type,
-                self.custom_dict,
-                self.stop_words
-            )
+            # 第二阶段：停用词 / 强制保留词 / 实体筛选
+            word_counter = filter_counts(raw_counts, self.filter_type, profile.stop_words, profile.vip_words)
 
-            if not clean_words_list:
+            if not word_counter:
                 self.error.emit(f"在'{mode_name}'模式下未找到有效词汇。")
                 return
 
-            word_counts = dict(Counter(clean_words_list).most_common(self.max_words))
-            clean_text_for_cloud = " ".join(clean_words_list)
+            word_counts = dict(word_counter.most_common(self.max_words))
 
-            unique_words = len(set(clean_words_list))
-            total_words = len(clean_words_list)
+            unique_words = len(word_counter)
+            total_words = sum(word_counter.values())
             seg_summary = f"总词数: {total_words:,} | 唯一词: {unique_words:,}"
+            if balance is not None:
+                seg_summary += f" | 负载均衡: {balance:.0%}"
             timings['segment'] = time.time() - t_start
+            if 'files' in timings:
+                # 语料模式：文件数与整体吞吐量 (读取 + 分词)
+                seg_summary += f" | 文件: {timings['files']:,} 个"
+                if timings['failed_files']:
+                    seg_summary += f" (失败 {timings['failed_files']} 个)"
+                seg_summary += f" | 吞吐: {self._format_size(file_size / max(timings['segment'], 1e-6))}/s"
 
-            target_width, target_height = self._calculate_resolution(len(clean_words_list))
+            target_width, target_height = self._calculate_resolution(total_words)
             self.progress_step.emit(2, f"正在渲染高清图片 ({target_width}x{target_height})...", seg_summary)
             t_start = time.time()
 
-            generator = WordCloudGenerator(self.font_path)
-            pil_image = generator.generate(
-                clean_text_for_cloud,
+            fonts_before = FONT_CACHE.stats()
+            generator = WordCloudGenerator(self.font_path, mask_cache=self.mask_cache,
+                                           refine_layout=self.refine_layout,
+                                           rasterizer=self.rasterizer,
+                                           vector_only=self.vector_only,
+                                           memory_budget=self.memory_budget,
+                                           downscale_to_budget=self.downscale_to_budget,
+                                           reserve_display=True)
+            # 🟢 直接使用分词阶段的词频表，不再拼接全文交给 WordCloud 重新切分
+            pil_image = generator.generate_from_frequencies(
+                word_counter,
                 mask_image_path=self.mask_path,
                 bg_color=self.bg_color,
+                color_map=self.color_map,
                 width=target_width,
                 height=target_height,
-                max_words=self.max_words
+                max_words=self.max_words,
+                # 🟢 输出比预览图大时才发预览，先让用户看到排版结果
+                on_preview=self.preview_ready.emit if target_width > PREVIEW_WIDTH and not self.vector_only else None
             )
 
+            if generator.downscaled_from is not None:
+                target_width, target_height = generator.last_cloud.output_size()
             render_summary = f"分辨率: {target_width}x{target_height}"
+            if generator.downscaled_from is not None:
+                render_summary += " (内存预算限制，已缩小)"
+            if self.vector_only:
+                render_summary += " | 仅矢量输出"
+            fonts_after = FONT_CACHE.stats()
+            font_hit_rate = self._hit_rate(fonts_before, fonts_after, "font")
+            bbox_hit_rate = self._hit_rate(fonts_before, fonts_after, "bbox")
+            if font_hit_rate is not None:
+                render_summary += f" | 字体缓存命中: {font_hit_rate:.0%}"
+            if bbox_hit_rate is not None:
+                render_summary += f" | 外框缓存命中: {bbox_hit_rate:.0%}"
             timings['render'] = time.time() - t_start
             timings['total'] = time.time() - total_start
+            # 🟢 实际峰值内存 (进程启动以来) 与本次的预计值
+            timings['peak_rss'] = peak_rss()
+            timings['estimated_memory'] = generator.last_memory_estimate["peak"]
+            if timings['peak_rss'] is not None:
+                render_summary += f" | 峰值内存: {self._format_size(timings['peak_rss'])}"
+            render_summary += f" (渲染预计 {self._format_size(timings['estimated_memory'])})"
+            self.generator = generator
 
             self.progress_step.emit(3, "完成", render_summary)
             self.finished.emit(pil_image, word_counts, timings)
@@ -98,14 +232,231 @@ class WordCloudWorker(QThread):
             traceback.print_exc()
             self.error.emit(f"错误: {str(e)}")
 
+    def _tokenize(self, tokenizer, profile, file_size, size_str, timings):
+        """
+        读取并分词
+        :return: (原始词频, 字符数, 分词开始时间, 负载均衡率)；文件无内容时发出 error 并返回 None
+                 负载均衡率只在使用进程池时有值，其余为 None
+        """
+        t_start = time.time()
+        mapped = FileLoader.map_text_ranges(self.file_path, tokenizer.chunk_chars) \
+            if self._use_streaming(file_size) else None
+        if mapped:
+            # 🟢 内存映射模式：只按换行字节划分块，子进程各自读取、解码自己的字节范围
+            encoding, ranges = mapped
+            timings['read'] = time.time() - t_start
+            self.progress_step.emit(1, f"正在并行分词 ({tokenizer.processes}核)...",
+                                    f"大小: {size_str} | 内存映射 | 编码: {encoding.upper()}")
+            t_start = time.time()
+
+            def report(progress):
+                consumed = progress["consumed"]
+                rate = consumed / max(time.time() - t_start, 1e-6)
+                self.progress_detail.emit(
+                    f"已处理 {self._format_size(consumed)} / {size_str} "
+                    f"({self._format_size(rate)}/s)")
+                self.progress_percent.emit(progress["done"] * 100 // progress["total"])
+
+            raw_counts, char_count = tokenizer.run_mapped(
+                self.file_path, encoding, ranges,
+                segment_mode(self.filter_type),
+                profile.dictionary_path,
+                on_progress=report
+            )
+            if char_count == 0:
+                self.error.emit("文件中没有任何文字内容！")
+                return None
+            return raw_counts, char_count, t_start, tokenizer.last_stats.get("balance")
+
+        if self._use_streaming(file_size):
+            # 🟢 流式模式：读取与分词交织进行，只保留词频表
+            timings['read'] = time.time() - t_start
+            self.progress_step.emit(1, f"正在流式分词 ({tokenizer.processes}核)...",
+                                    f"大小: {size_str} | 流式读取")
+            t_start = time.time()
+
+            def report(progress):
+                consumed = progress["consumed"]
+                rate = consumed / max(time.time() - t_start, 1e-6)
+                self.progress_detail.emit(
+                    f"已处理 {self._format_size(consumed)} / {size_str} "
+                    f"({self._format_size(rate)}/s)")
+                self.progress_percent.emit(int(consumed * 100 / max(file_size, 1)))
+
+            raw_counts, char_count = tokenizer.run_stream(
+                FileLoader.iter_blocks(self.file_path, pdf_text_only=self.pdf_text_only),
+                segment_mode(self.filter_type),
+                profile.dictionary_path,
+                on_progress=report
+            )
+            if char_count == 0:
+                self.error.emit("文件中没有任何文字内容！")
+                return None
+            return raw_counts, char_count, t_start, tokenizer.last_stats.get("balance")
+
+        def report_pages(done, total):
+            self.progress_detail.emit(f"正在提取 PDF 文字: 第 {done}/{total} 页")
+            self.progress_percent.emit(done * 100 // total)
+
+        # 🟢 PDF 按页段多进程并行提取，逐页报告进度
+        read_info = {}
+        text = FileLoader.read_file(self.file_path, on_progress=report_pages, pdf_text_only=self.pdf_text_only,
+                                    info=read_info)
+        if not text.strip():
+            self.error.emit("文件中没有任何文字内容！")
+            return None
+
+        char_count = len(text)
+        read_summary = f"大小: {size_str} | 字数: {char_count:,}"
+        timings['read'] = time.time() - t_start
+        if "encoding" in read_info:
+            # 文本文件：显示识别出的编码与读取解码速度
+            rate = file_size / max(timings['read'], 1e-6)
+            read_summary += f" | 编码: {read_info['encoding'].upper()} | 读取: {self._format_size(rate)}/s"
+
+        seg_mode = segment_mode(self.filter_type)
+        strategy = self._plan(tokenizer, profile, text, seg_mode)
+        if strategy == PROCESS:
+            step_text = f"正在进行并行分词 ({tokenizer.processes}核)..."
+        elif strategy == THREAD:
+            step_text = f"正在多线程分词 ({tokenizer.processes}线程)..."
+        else:
+            step_text = "正在分词 (单进程)..."
+        self.progress_step.emit(1, step_text, read_summary)
+        t_start = time.time()
+
+        def report(progress):
+            done, total = progress["done"], progress["total"]
+            self.progress_detail.emit(f"已完成 {done}/{total} 块 ({done * 100 // total}%)")
+            self.progress_percent.emit(done * 100 // total)
+
+        if strategy == PROCESS:
+            raw_counts = tokenizer.run_parallel(
+                text,
+                seg_mode,
+                profile.dictionary_path,
+                on_progress=report
+            )
+            return raw_counts, char_count, t_start, tokenizer.last_stats.get("balance")
+
+        # 🟢 小文件在当前进程内分词，省去进程池启动与进程间传输
+        threads = tokenizer.processes if strategy == THREAD else 1
+        raw_counts = Tokenizer(chunk_chars=tokenizer.chunk_chars).count(
+            text,
+            seg_mode,
+            profile.dictionary_path,
+            threads=threads,
+            on_progress=report
+        )
+        return raw_counts, char_count, t_start, None
+
+    def _tokenize_corpus(self, tokenizer, profile, files, size_str, timings):
+        """
+        语料模式：多个文件由进程池并行读取并分词，先完成的文件先合并
+        :return: 同 _tokenize
+        """
+        timings['read'] = 0.0
+        self.progress_step.emit(1, f"正在并行读取与分词 ({tokenizer.processes}核)...",
+                                f"文件: {len(files):,} 个 | 大小: {size_str}")
+        t_start = time.time()
+        state = {"bytes": 0, "failed": 0}
+
+        def report(progress):
+            info = progress["file"]
+            if info["error"]:
+                state["failed"] += 1
+                print(f"读取失败，已跳过: {info['path']} ({info['error']})")
+            state["bytes"] += info["bytes"]
+            # 🟢 单个文件的读取+分词速度，以及到目前为止的整体吞吐量
+            file_rate = info["bytes"] / max(info["seconds"], 1e-6)
+            total_rate = state["bytes"] / max(time.time() - t_start, 1e-6)
+            self.progress_detail.emit(
+                f"已完成 {progress['done']:,}/{progress['total']:,} 个文件 | "
+                f"{os.path.basename(info['path'])} ({self._format_size(file_rate)}/s) | "
+                f"总计 {self._format_size(total_rate)}/s")
+            self.progress_percent.emit(progress["done"] * 100 // progress["total"])
+
+        raw_counts, char_count = tokenizer.run_files(
+            files,
+            segment_mode(self.filter_type),
+            profile.dictionary_path,
+            on_progress=report,
+            pdf_text_only=self.pdf_text_only
+        )
+        timings['files'] = len(files)
+        timings['failed_files'] = state["failed"]
+        if char_count == 0:
+            self.error.emit("所选文档中没有任何文字内容！")
+            return None
+        return raw_counts, char_count, t_start, tokenizer.last_stats.get("balance")
+
+    def _plan(self, tokenizer, profile, text, seg_mode):
+        """选择执行方式 (见 core.planner)，首次使用时先做一次本机校准"""
+        if self.planner is None:
+            return PROCESS
+        if self.planner.needs_calibration():
+            self.progress_detail.emit("首次运行：正在测量本机分词速度...")
+            try:
+                self.planner.calibrate(text, profile.dictionary_path)
+            except Exception as e:
+                print(f"分词校准失败: {e}")
+        strategy, _ = self.planner.plan(
+            len(text), seg_mode, tokenizer.processes, tokenizer.chunk_chars,
+            pool_ready=tokenizer.is_ready(profile.dictionary_path),
+            dictionary_ready=dictionary_loaded(profile.dictionary_path))
+        return strategy
+
+    def _compile_profile(self):
+        compiler = self.profile_compiler or ProfileCompiler()
+        if compiler.find_dictionary(self.custom_dict) is None:
+            self.progress_detail.emit("正在编译配置方案词典 (仅首次)...")
+        return compiler.compile(self.custom_dict, self.stop_words)
+
+    def _cache_key(self):
+        """计算分词缓存键；缓存不可用时返回 None，不影响正常生成"""
+        if self.token_cache is None or self._is_corpus():
+            # 语料模式不缓存：为上万个文件逐一计算内容哈希，开销与重新读取相当
+            return None
+        try:
+            self.progress_detail.emit("正在校验分词缓存...")
+            engine_version = TOKENIZER_VERSION
+            # 提取方式不同时文本略有不同 (例如 PDF 只取文字层)，分词结果分开缓存
+            extractor = FileLoader.extractor_version(self.file_path, self.pdf_text_only)
+            if extractor:
+                engine_version += "+" + extractor
+            return self.token_cache.make_key(self.file_path, segment_mode(self.filter_type),
+                                             self.custom_dict, engine_version)
+        except Exception as e:
+            print(f"分词缓存不可用: {e}")
+            return None
+
+    def _store_cache(self, cache_key, raw_counts, char_count):
+        try:
+            self.token_cache.put(cache_key, raw_counts, {"chars": char_count})
+        except Exception as e:
+            print(f"分词缓存写入失败: {e}")
+
+    def _is_corpus(self):
+        return isinstance(self.file_path, (list, tuple))
+
+    def _use_streaming(self, file_size):
+        if self.streaming is not None:
+            return self.streaming
+        return file_size >= self.STREAMING_THRESHOLD
+
+    @staticmethod
+    def _hit_rate(before, after, kind):
+        """本次生成期间的缓存命中率，没有查询时返回 None"""
+        hits = after[f"{kind}_hits"] - before[f"{kind}_hits"]
+        total = hits + after[f"{kind}_misses"] - before[f"{kind}_misses"]
+        return hits / total if total else None
+
     def _format_size(self, size):
-        for unit in ['B', 'KB', 'MB', 'GB']:
-            if size < 1024:
-                return f"{size:.1f} {unit}"
-            size /= 1024
-        return f"{size:.1f} TB"
+        return format_size(size)
 
     def _calculate_resolution(self, word_count):
+        if self.resolution_setting in self.RESOLUTION_PRESETS:
+            return self.RESOLUTION_PRESETS[self.resolution_setting]
         if self.resolution_setting != "auto":
             try:
                 dim_part = self.resolution_setting.split(' ')[0]
@@ -126,4 +477,55 @@ class WordCloudWorker(QThread):
 
     def _get_mode_name(self):
         mapping = {"all": "全文", "name": "人名", "location": "地名", "name_location": "实体", "org": "机构"}
-        return mapping.get(self.filter_type, "未知")
\ No newline at end of file
+        return mapping.get(self.filter_type, "未知")
+
+
+class RecolorWorker(QThread):
+    """沿用上次的排版，只换配色/背景重新绘制 (见 WordCloudGenerator.recolor)"""
+    finished = Signal(object, float)
+    error = Signal(str)
+
+    def __init__(self, generator, bg_color=None, color_map=None):
+        super().__init__()
+        self.generator = generator
+        self.bg_color = bg_color
+        self.color_map = color_map
+
+    def run(self):
+        try:
+            t_start = time.time()
+            pil_image = self.generator.recolor(bg_color=self.bg_color, color_map=self.color_map)
+            self.finished.emit(pil_image, time.time() - t_start)
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            self.error.emit(f"错误: {str(e)}")
+
+
+class SaveWorker(QThread):
+    """在后台保存图片，完成后报告编码耗时与文件大小"""
+    finished = Signal(str, float, object)
+    error = Signal(str)
+    # 保存进度 (0-100)；-1 表示该格式无法报告中间进度
+    progress = Signal(int)
+
+    def __init__(self, save, path, reports_progress=True):
+        """
+        :param save: 保存函数，接收关键字参数 on_progress (见 core.image_export.save_image)
+        """
+        super().__init__()
+        self.save = save
+        self.path = path
+        self.reports_progress = reports_progress
+
+    def run(self):
+        try:
+            t_start = time.time()
+            if not self.reports_progress:
+                self.progress.emit(-1)
+            self.save(on_progress=self.progress.emit)
+            self.finished.emit(self.path, time.time() - t_start, os.path.getsize(self.path))
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            self.error.emit(f"错误: {str(e)}")
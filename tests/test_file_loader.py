@@ -0,0 +1,32 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.file_loader import FileLoader, _detect_encoding  # noqa: E402
+
+TEXT = "词云生成器：经济发展与人工智能。\nHello, world!\n" * 50
+
+
+@pytest.mark.parametrize("encoding", ["utf-8", "utf-8-sig", "gbk", "utf-16", "utf-16-le", "utf-16-be"])
+def test_read_txt_encodings(tmp_path, encoding):
+    path = tmp_path / "sample.txt"
+    path.write_bytes(TEXT.encode(encoding))
+    info = {}
+    assert FileLoader.read_file(str(path), info=info) == TEXT
+    assert info["encoding"] in (encoding, "utf-16")
+
+
+def test_detect_encoding_rejects_other_encodings():
+    # latin-1 文本既不是 UTF-8 也不是 GBK，且没有 BOM 和 NUL 字节
+    sample = "café. déjà. à côté. ".encode("latin-1") * 20
+    with pytest.raises(ValueError, match="无法识别的文件编码"):
+        _detect_encoding(sample, at_start=True)
+
+
+def test_read_txt_reports_unknown_encoding(tmp_path):
+    path = tmp_path / "latin1.txt"
+    path.write_bytes("café. déjà. à côté. ".encode("latin-1") * 20)
+    assert FileLoader.read_file(str(path)) == "读取失败: 无法识别的文件编码，请确保是UTF-8或GBK"
@@ -0,0 +1,34 @@
+import glob
+import os
+import sys
+from random import Random
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from core.generator import WordCloudGenerator  # noqa: E402
+
+MASK_PATH = sorted(glob.glob(os.path.join(ROOT, "assets", "masks", "*", "*.png")))[0]
+# 词数远多于画布放得下的数量，放下多少个词取决于间距、最小字号与字号步长
+FREQUENCIES = {f"w{i}": 100000 // (1 + i) ** 1.1 + 1 for i in range(3000)}
+WIDTH, HEIGHT = 1600, 1200
+
+
+def _layout(max_layout_pixels, mask_image_path):
+    generator = WordCloudGenerator(max_layout_pixels=max_layout_pixels)
+    wc, _ = generator._create_wordcloud(mask_image_path, 'white', len(FREQUENCIES), 'viridis', WIDTH, HEIGHT)
+    # 固定随机种子，两种排版方式的结果可重复
+    wc.random_state = Random(0)
+    wc.generate_from_frequencies(FREQUENCIES)
+    return wc
+
+
+@pytest.mark.parametrize("mask_image_path", [None, MASK_PATH])
+def test_downscaled_layout_fits_as_many_words(mask_image_path):
+    full = _layout(None, mask_image_path)
+    scaled = _layout(WIDTH * HEIGHT // 4, mask_image_path)
+    assert scaled.scale == 2
+    assert scaled.output_size() == full.output_size()
+    assert len(scaled.layout_) >= 0.9 * len(full.layout_)